@@ -0,0 +1,170 @@
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+
+from extensions import db
+from models import Venue, Artist, Show
+from output import buffered
+from queries import SHOW_ORDER, shows_query, venue_page, artist_page, genre_page, genre_totals
+from replicas import read_only
+from typeahead import typeahead
+
+api = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+NDJSON = 'application/x-ndjson'
+
+
+#----------------------------------------------------------------------------#
+# Streaming.
+#----------------------------------------------------------------------------#
+
+def wants_ndjson():
+    if request.args.get('format') in ('ndjson', 'json'):
+        return request.args['format'] == 'ndjson'
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON])
+    return best == NDJSON
+
+
+def encode(value):
+    # Serializers hand datetimes through for the templates; the API keeps
+    # printing them the way it always has.
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    raise TypeError('{!r} is not JSON serializable'.format(value))
+
+
+def dumps(item):
+    return json.dumps(item, default=encode)
+
+
+def ndjson_lines(items):
+    for item in items:
+        yield dumps(item) + '\n'
+
+
+def json_array(items):
+    yield '['
+    separator = ''
+    for item in items:
+        yield separator + dumps(item)
+        separator = ','
+    yield ']'
+
+
+def stream(query, serializer):
+    # yield_per runs the query on a server-side cursor and builds objects in
+    # batches, so memory stays flat however many rows are exported.
+    items = map(serializer, query.yield_per(current_app.config['API_YIELD_PER']))
+    if wants_ndjson():
+        pieces, mimetype = ndjson_lines(items), NDJSON
+    else:
+        pieces, mimetype = json_array(items), 'application/json'
+    chunks = buffered(pieces, current_app.config['API_CHUNK_SIZE'])
+    return Response(stream_with_context(chunks), mimetype=mimetype)
+
+
+#----------------------------------------------------------------------------#
+# Genre browsing.
+#----------------------------------------------------------------------------#
+
+def genre_listing(model):
+    return jsonify({'genres': [total._asdict() for total in genre_totals(model)]})
+
+
+def genre_browse(model, genre):
+    page = genre_page(model, genre, request.args.get('cursor'))
+    return jsonify({
+        'genre': genre,
+        'data': [row._asdict() for row in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    })
+
+
+#----------------------------------------------------------------------------#
+# Typeahead.
+#----------------------------------------------------------------------------#
+
+def suggestions(model):
+    # Served from memory; the limit can only be lowered below TYPEAHEAD_LIMIT.
+    data = typeahead(model, request.args.get('q', ''), request.args.get('limit', type=int))
+    return jsonify({'data': data})
+
+
+#----------------------------------------------------------------------------#
+# Endpoints.
+#----------------------------------------------------------------------------#
+
+@api.route('/shows')
+@read_only
+def shows():
+    return stream(shows_query().order_by(*SHOW_ORDER), Show.details)
+
+
+@api.route('/venues')
+@read_only
+def venues():
+    query = Venue.query.options(db.selectinload(Venue.genre_list)).order_by(Venue.id)
+    return stream(query, Venue.details)
+
+
+@api.route('/venues/genres')
+@read_only
+def venue_genres():
+    return genre_listing(Venue)
+
+
+@api.route('/venues/genres/<genre>')
+@read_only
+def venues_by_genre(genre):
+    return genre_browse(Venue, genre)
+
+
+@api.route('/venues/typeahead')
+@read_only
+def venue_typeahead():
+    return suggestions(Venue)
+
+
+@api.route('/venues/<int:venue_id>')
+@read_only
+def venue(venue_id):
+    venue_details = venue_page(venue_id)
+    if venue_details is None:
+        return jsonify({'error': 'Venue not found'}), 404
+    return Response(dumps(venue_details), mimetype='application/json')
+
+
+@api.route('/artists')
+@read_only
+def artists():
+    query = Artist.query.options(db.selectinload(Artist.genre_list)).order_by(Artist.id)
+    return stream(query, Artist.details)
+
+
+@api.route('/artists/genres')
+@read_only
+def artist_genres():
+    return genre_listing(Artist)
+
+
+@api.route('/artists/genres/<genre>')
+@read_only
+def artists_by_genre(genre):
+    return genre_browse(Artist, genre)
+
+
+@api.route('/artists/typeahead')
+@read_only
+def artist_typeahead():
+    return suggestions(Artist)
+
+
+@api.route('/artists/<int:artist_id>')
+@read_only
+def artist(artist_id):
+    artist_details = artist_page(artist_id)
+    if artist_details is None:
+        return jsonify({'error': 'Artist not found'}), 404
+    return Response(dumps(artist_details), mimetype='application/json')
@@ -0,0 +1,232 @@
+import asyncio
+import io
+import sys
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import ArgumentError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+from werkzeug.exceptions import HTTPException
+
+from app import create_app
+from extensions import db
+from replicas import ReplicaSet, replica_keys, request_replica, track_writes
+from typeahead import load_indexes
+
+app = create_app()
+
+# Views served on the event loop. Their statements go through an async
+# driver, so a page waiting on Postgres no longer holds a worker thread;
+# every other endpoint runs the regular WSGI app on a thread. Rendering
+# is still CPU work on the loop's own thread: while one page renders, the
+# other requests of that process wait, so run one uvicorn worker per core.
+ASYNC_ENDPOINTS = frozenset([
+    'pages.index', 'pages.venues', 'pages.show_venue', 'pages.search_venues',
+    'pages.artists', 'pages.show_artist', 'pages.search_artists', 'pages.shows',
+])
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+_engines = {}
+_replicas = None
+
+
+#----------------------------------------------------------------------------#
+# Async engines.
+#----------------------------------------------------------------------------#
+
+def async_engine(bind=None):
+    # One per bind, replicas included. Created on first use so the pool
+    # belongs to the running event loop.
+    if bind not in _engines:
+        if bind is None:
+            url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        else:
+            url = make_url(app.config['SQLALCHEMY_BINDS'][bind])
+        if url.get_backend_name() not in ASYNC_DRIVERS:
+            raise ArgumentError('No async driver for {}'.format(url.get_backend_name()))
+        url = url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+        options = {}
+        if url.get_backend_name() == 'postgresql':
+            options = {
+                'pool_size': app.config['ASYNC_DB_POOL_SIZE'],
+                'max_overflow': app.config['ASYNC_DB_MAX_OVERFLOW'],
+                'pool_recycle': app.config['DB_POOL_RECYCLE'],
+                'pool_pre_ping': app.config['DB_POOL_PRE_PING'],
+                'connect_args': {'server_settings': {
+                    'statement_timeout': str(app.config['DB_STATEMENT_TIMEOUT_MS']),
+                    'idle_in_transaction_session_timeout':
+                        str(app.config['DB_IDLE_IN_TRANSACTION_TIMEOUT_MS']),
+                }},
+            }
+        _engines[bind] = create_async_engine(url, **options)
+    return _engines[bind]
+
+
+def async_replicas():
+    # Health-checked like the WSGI side's replicas (see ReplicaSet), but
+    # over the async engines; checks run inside the greenlet bridge.
+    global _replicas
+    if _replicas is None:
+        _replicas = ReplicaSet(
+            replica_keys(app), lambda key: async_engine(key).sync_engine,
+            app.config['REPLICA_HEALTH_INTERVAL'], app.config['REPLICA_MAX_LAG'])
+    return _replicas
+
+
+@track_writes
+class AsyncRoutingSession(Session):
+    # The async session's sync facade, routed like RoutingSession: reads in
+    # a @read_only view go to a healthy replica unless this visitor wrote
+    # within READ_YOUR_WRITES_WINDOW, everything else to the primary.
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica = request_replica(self, async_replicas().pick)
+        if replica is not None:
+            return replica
+        return Session.get_bind(self, mapper, clause, **kwargs)
+
+
+#----------------------------------------------------------------------------#
+# WSGI bridge.
+#----------------------------------------------------------------------------#
+
+def build_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope['http_version']),
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key in environ:
+            # Repeated headers fold into one, except cookies, whose pairs
+            # are separated by semicolons.
+            value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+        environ[key] = value
+    return environ
+
+
+def endpoint(environ):
+    try:
+        return app.url_map.bind_to_environ(environ).match()[0]
+    except HTTPException:
+        return None
+
+
+def call_app(environ):
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split()[0]),
+                      [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                       for name, value in headers]]
+
+    chunks = app.wsgi_app(environ, start_response)
+    return started, chunks
+
+
+def relay(started, chunks, deliver):
+    # Headers go out with the first chunk: a streamed response calls
+    # start_response before its body, but nothing is sent until then.
+    try:
+        headers_sent = False
+        for chunk in chunks:
+            if not headers_sent:
+                deliver({'type': 'http.response.start', 'status': started[0], 'headers': started[1]})
+                headers_sent = True
+            if chunk:
+                deliver({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        if not headers_sent:
+            deliver({'type': 'http.response.start', 'status': started[0], 'headers': started[1]})
+        deliver({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def render(session, environ, send):
+    # Runs the unchanged Flask view inside SQLAlchemy's greenlet bridge:
+    # db.session is the async session's sync facade for this greenlet, so
+    # the views, queries, templates and serializers all work as they are
+    # while each statement awaits asyncpg underneath. Chunks are awaited
+    # out through the same bridge, so streamed pages stay streamed.
+    db.session.registry.set(session)
+    try:
+        relay(*call_app(environ), deliver=lambda message: await_only(send(message)))
+    finally:
+        db.session.registry.clear()
+
+
+def stream(environ, loop, send):
+    # Runs on a worker thread; chunks are handed to the event loop as they
+    # are produced so the streaming API exports stay streamed.
+    def deliver(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    relay(*call_app(environ), deliver=deliver)
+
+
+#----------------------------------------------------------------------------#
+# ASGI application.
+#----------------------------------------------------------------------------#
+
+async def read_body(receive):
+    body = []
+    while True:
+        message = await receive()
+        body.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(body)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await asyncio.get_running_loop().run_in_executor(None, load_indexes, app)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            for engine in _engines.values():
+                await engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    environ = build_environ(scope, await read_body(receive))
+    if endpoint(environ) in ASYNC_ENDPOINTS:
+        async with AsyncSession(async_engine(), sync_session_class=AsyncRoutingSession) as session:
+            await session.run_sync(render, environ, send)
+    else:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, stream, environ, loop, send)
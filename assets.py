@@ -0,0 +1,200 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+import click
+from flask import current_app, request, send_file, url_for
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+# Optional: without the Brotli package only gzip copies are written.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bundles served by the layout, in load order, relative to the static
+# folder. head.js runs before the page renders, body.js after.
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+        'js/script.js',
+    ],
+    'body.js': [
+        'js/libs/jquery-1.11.1.min.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+# Files referenced on their own, fingerprinted as they are.
+STANDALONE = [
+    'js/typeahead.js',
+    'js/libs/respond-1.4.2.min.js',
+]
+
+MANIFEST = 'manifest.json'
+
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+CSS_SPACE = re.compile(r'\s+')
+CSS_PUNCTUATION = re.compile(r'\s*([{};,])\s*')
+
+
+#----------------------------------------------------------------------------#
+# Building.
+#----------------------------------------------------------------------------#
+
+def absolute_urls(css, source, static_url_path):
+    # Bundles are served from another directory than their sources, so
+    # relative url()s are rewritten against the source's own folder.
+    def rewrite(match):
+        quote, url = match.groups()
+        if re.match(r'^([a-z]+:|/|#)', url):
+            return match.group(0)
+        path, suffix = re.match(r'^([^?#]*)(.*)$', url).groups()
+        resolved = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+        return 'url({0}{1}/{2}{3}{0})'.format(quote, static_url_path, resolved, suffix)
+    return CSS_URL.sub(rewrite, css)
+
+
+def minify_css(css):
+    # Comments and whitespace only; nothing that could change a rule.
+    css = CSS_COMMENT.sub('', css)
+    css = CSS_SPACE.sub(' ', css)
+    return CSS_PUNCTUATION.sub(r'\1', css).strip()
+
+
+def bundle(static_folder, static_url_path, name, sources):
+    pieces = []
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as handle:
+            text = handle.read()
+        if name.endswith('.css'):
+            pieces.append(minify_css(absolute_urls(text, source, static_url_path)))
+        else:
+            # The libraries ship minified; a separator keeps a file without
+            # a trailing semicolon from running into the next one.
+            pieces.append(text.strip().rstrip(';') + ';')
+    return '\n'.join(pieces).encode('utf-8')
+
+
+def fingerprinted(name, content):
+    stem, extension = os.path.splitext(name)
+    return '{}.{}{}'.format(stem, hashlib.sha256(content).hexdigest()[:12], extension)
+
+
+def write_asset(directory, filename, content):
+    # Precompressed next to the original so serving one is a file lookup.
+    path = os.path.join(directory, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as handle:
+        handle.write(content)
+    with open(path + '.gz', 'wb') as handle:
+        handle.write(gzip.compress(content, 9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as handle:
+            handle.write(brotli.compress(content, quality=11))
+
+
+def build(app):
+    # Returns the manifest: logical name to fingerprinted file name.
+    directory = app.config['ASSETS_DIRECTORY']
+    manifest = {}
+    contents = dict((name, bundle(app.static_folder, app.static_url_path, name, sources))
+                    for name, sources in BUNDLES.items())
+    for name in STANDALONE:
+        with open(os.path.join(app.static_folder, name), 'rb') as handle:
+            contents[name] = handle.read()
+    for name, content in sorted(contents.items()):
+        manifest[name] = fingerprinted(name, content)
+        write_asset(directory, manifest[name], content)
+    with open(os.path.join(directory, MANIFEST), 'w') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    return manifest
+
+
+@click.command('build-assets')
+def build_command():
+    """Bundle, fingerprint and precompress the static assets."""
+    manifest = build(current_app)
+    for name, filename in sorted(manifest.items()):
+        click.echo('{} -> {}'.format(name, filename))
+    if brotli is None:
+        click.echo('Brotli is not installed; only gzip copies were written.')
+
+
+#----------------------------------------------------------------------------#
+# Serving.
+#----------------------------------------------------------------------------#
+
+class Assets(object):
+    # Built bundles are served from /assets with far-future immutable cache
+    # headers; a new build changes every URL whose content changed. Without
+    # a manifest (a fresh checkout) templates link the source files.
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.directory = None
+        self.max_age = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config['ASSETS_DIRECTORY']
+        self.max_age = app.config['ASSETS_MAX_AGE']
+        self.manifest = self.load()
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.view)
+        app.add_template_global(self.asset_url)
+        app.add_template_global(self.asset_urls)
+        app.cli.add_command(build_command)
+
+    def load(self):
+        try:
+            with open(os.path.join(self.directory, MANIFEST)) as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return {}
+
+    def asset_url(self, filename):
+        # Drop-in for url_for('static', filename=...).
+        if filename in self.manifest:
+            return url_for('assets', filename=self.manifest[filename])
+        return url_for('static', filename=filename)
+
+    def asset_urls(self, name):
+        # The bundle when built, its sources otherwise.
+        if name in self.manifest or name not in BUNDLES:
+            return [self.asset_url(name)]
+        return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+    def view(self, filename):
+        path = safe_join(self.directory, filename)
+        if path is None or filename == MANIFEST or not os.path.isfile(path):
+            raise NotFound()
+        encoding = None
+        for candidate, extension in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[candidate] and os.path.isfile(path + extension):
+                encoding, path = candidate, path + extension
+                break
+        response = send_file(path, mimetype=mimetypes.guess_type(filename)[0], conditional=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = 'public, max-age={}, immutable'.format(self.max_age)
+        return response
+
+
+assets = Assets()
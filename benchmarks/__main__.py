@@ -0,0 +1,165 @@
+import json
+import sys
+
+import click
+
+from app import create_app
+from extensions import db
+from models import Venue, Artist
+from benchmarks import concurrency, formatting, output, pool, read_models, routes, startup, typeahead
+from benchmarks.seed import seed as seed_catalog
+
+app = create_app()
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@click.group()
+def cli():
+    """Fyyur benchmarks. Run with `python -m benchmarks`."""
+
+
+@cli.command()
+@click.option('--venues', default=1000, show_default=True)
+@click.option('--artists', default=5000, show_default=True)
+@click.option('--shows', default=100000, show_default=True)
+@click.option('--seed', 'random_seed', default=0, show_default=True,
+              help='Random seed; the same seed generates the same catalog.')
+def seed(venues, artists, shows, random_seed):
+    """Fill the database with a synthetic catalog."""
+    with app.app_context():
+        seed_catalog(venues, artists, shows, random_seed, echo=click.echo)
+
+
+@cli.command('routes')
+@click.option('--iterations', default=100, show_default=True, help='Timed requests per route.')
+@click.option('--warmup', default=5, show_default=True, help='Untimed requests per route.')
+@click.option('--cache', is_flag=True, help='Keep the response cache switched on.')
+@click.option('--save', 'save_path', type=click.Path(dir_okay=False),
+              help='Write the results to this JSON file as a new baseline.')
+@click.option('--compare', 'compare_path', type=click.Path(exists=True, dir_okay=False),
+              help='Compare the results with this baseline and fail on regressions.')
+@click.option('--threshold', default=0.2, show_default=True,
+              help='Allowed p95 slowdown before a route counts as regressed.')
+def time_routes(iterations, warmup, cache, save_path, compare_path, threshold):
+    """Time every page through the test client."""
+    with app.app_context():
+        results = routes.run(iterations, warmup, cache, echo=click.echo)
+    if save_path:
+        routes.save(results, save_path)
+        click.echo('Baseline written to {}'.format(save_path))
+    if compare_path:
+        regressions = routes.compare(routes.load(compare_path), results, threshold, echo=click.echo)
+        if regressions:
+            click.echo('{} route(s) regressed'.format(len(regressions)))
+            sys.exit(1)
+
+
+def pool_setting(value):
+    try:
+        pool_size, max_overflow, timeout = (value.split(':') + ['', ''])[:3]
+        return int(pool_size), int(max_overflow or 0), int(timeout or 5)
+    except ValueError:
+        raise click.BadParameter('expected POOL_SIZE[:MAX_OVERFLOW[:TIMEOUT]], got {}'.format(value))
+
+
+@cli.command('pool')
+@click.option('--setting', 'settings', multiple=True, default=['2:0', '5:0', '5:10', '20:0'],
+              show_default=True, help='POOL_SIZE[:MAX_OVERFLOW[:TIMEOUT]]; repeat to compare.')
+@click.option('--threads', default=16, show_default=True, help='Concurrent clients.')
+@click.option('--duration', default=10, show_default=True, help='Seconds per setting.')
+@click.option('--save', 'save_path', type=click.Path(dir_okay=False),
+              help='Write the results to this JSON file.')
+def pool_command(settings, threads, duration, save_path):
+    """Measure throughput under concurrent load for several pool settings."""
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            raise click.ClickException('The pool benchmark needs Postgres.')
+    results = pool.run([pool_setting(value) for value in settings], threads, duration, echo=click.echo)
+    if save_path:
+        routes.save(results, save_path)
+
+
+@cli.command('pool-load', hidden=True)
+@click.option('--threads', default=16)
+@click.option('--duration', default=10)
+def pool_load(threads, duration):
+    with app.app_context():
+        click.echo(json.dumps(pool.load(threads, duration)))
+
+
+@cli.command('concurrency')
+@click.option('--clients', multiple=True, type=int, default=[100, 250, 500, 1000],
+              show_default=True, help='Concurrent clients; repeat to compare.')
+@click.option('--duration', default=10, show_default=True, help='Seconds per client count.')
+@click.option('--workers', default=2, show_default=True, help='Server processes for both modes.')
+@click.option('--threads', default=4, show_default=True, help='Threads per sync worker.')
+@click.option('--port', default=8765, show_default=True)
+@click.option('--save', 'save_path', type=click.Path(dir_okay=False),
+              help='Write the results to this JSON file.')
+def concurrency_command(clients, duration, workers, threads, port, save_path):
+    """Compare requests/sec of the WSGI app and the async mode in asgi.py."""
+    with app.app_context():
+        venue = Venue.query.order_by(Venue.id).first()
+        artist = Artist.query.order_by(Artist.id).first()
+        if venue is None or artist is None:
+            raise click.ClickException('Seed the database first: python -m benchmarks seed')
+        paths = [path.format(venue_id=venue.id, artist_id=artist.id) for path in concurrency.PATHS]
+    results = concurrency.run(paths, clients, duration, workers, threads, port, echo=click.echo)
+    if save_path:
+        routes.save(results, save_path)
+
+
+@cli.command('formatting')
+@click.option('--rows', default=10000, show_default=True, help='Show start times to format.')
+@click.option('--format', 'date_format', type=click.Choice(['full', 'medium']), default='full',
+              show_default=True)
+def formatting_command(rows, date_format):
+    """Per-row cost of the template datetime filter, before and after caching."""
+    formatting.run(rows, date_format, echo=click.echo)
+
+
+@cli.command('read-models')
+@click.option('--rows', default=100000, show_default=True, help='Rows read per path.')
+@click.option('--repeat', default=3, show_default=True, help='Timed runs; the fastest counts.')
+def read_models_command(rows, repeat):
+    """Time and memory of ORM entities against projected records."""
+    with app.app_context():
+        read_models.run(rows, repeat, echo=click.echo)
+
+
+@cli.command('output')
+@click.option('--page-size', default=1000, show_default=True, help='Rows per listing page.')
+@click.option('--iterations', default=20, show_default=True)
+def output_command(page_size, iterations):
+    """Time to first byte and bytes sent for the listings, buffered and streamed."""
+    with app.app_context():
+        output.run(page_size, iterations, echo=click.echo)
+
+
+@cli.command('typeahead')
+@click.option('--entities', default=100000, show_default=True, help='Names in the prefix index.')
+@click.option('--lookups', default=10000, show_default=True)
+@click.option('--limit', default=10, show_default=True, help='Suggestions per lookup.')
+def typeahead_command(entities, lookups, limit):
+    """Lookup and update latency of the typeahead prefix index."""
+    typeahead.run(entities, lookups, limit, echo=click.echo)
+
+
+@cli.command('startup')
+@click.option('--repeat', default=5, show_default=True, help='Runs per measurement; the median is shown.')
+@click.option('--workers', default=4, show_default=True, help='Gunicorn workers for the memory comparison.')
+@click.option('--port', default=8766, show_default=True)
+@click.option('--save', 'save_path', type=click.Path(dir_okay=False),
+              help='Write the results to this JSON file.')
+def startup_command(repeat, workers, port, save_path):
+    """App factory, template compile and gunicorn boot time, with and without preload."""
+    results = startup.run(repeat, workers, port, echo=click.echo)
+    if save_path:
+        routes.save(results, save_path)
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks.routes import percentile
+
+
+# The same mix of read pages is sent to both servers.
+PATHS = ['/venues', '/artists', '/shows', '/venues/{venue_id}', '/artists/{artist_id}']
+
+SERVERS = {
+    'sync': ['gunicorn', '--workers', '{workers}', '--threads', '{threads}',
+             '--bind', '127.0.0.1:{port}', 'wsgi:app'],
+    'async': ['uvicorn', '--workers', '{workers}', '--port', '{port}',
+              '--no-access-log', 'asgi:application'],
+}
+
+
+#----------------------------------------------------------------------------#
+# Servers.
+#----------------------------------------------------------------------------#
+
+def start_server(mode, port, workers, threads):
+    # The response cache would answer most requests without touching the
+    # database, which is exactly what this benchmark needs to avoid.
+    environment = dict(os.environ, RESPONSE_CACHE_BACKEND='none')
+    command = [part.format(workers=workers, threads=threads, port=port) for part in SERVERS[mode]]
+    server = subprocess.Popen([sys.executable, '-m'] + command, env=environment,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('{} server did not start on port {}'.format(mode, port))
+
+
+#----------------------------------------------------------------------------#
+# Load.
+#----------------------------------------------------------------------------#
+
+async def fetch(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write('GET {} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n'.format(
+            path).encode('ascii'))
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def client_loop(port, paths, deadline, offset, latencies, errors):
+    position = offset
+    while time.perf_counter() < deadline:
+        path = paths[position % len(paths)]
+        position += 1
+        started = time.perf_counter()
+        try:
+            status = await fetch(port, path)
+        except (OSError, IndexError, ValueError):
+            status = None
+        if status == 200:
+            latencies.append((time.perf_counter() - started) * 1000)
+        else:
+            errors.append(status)
+
+
+async def load(port, paths, clients, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*[client_loop(port, paths, deadline, number, latencies, errors)
+                           for number in range(clients)])
+    elapsed = time.perf_counter() - started
+    return {
+        'clients': clients,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50), 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95), 2) if latencies else None,
+    }
+
+
+def run(paths, clients, duration, workers=2, threads=4, port=8765, echo=print):
+    # One load generator process drives up to a thousand connections, so at
+    # the top end it can become the bottleneck; compare modes, not totals.
+    results = []
+    for mode in ('sync', 'async'):
+        server = start_server(mode, port, workers, threads)
+        try:
+            asyncio.run(load(port, paths, 8, 2))
+            for count in clients:
+                result = asyncio.run(load(port, paths, count, duration))
+                result['mode'] = mode
+                results.append(result)
+                echo('{:<6} {:>5} clients: {:>8.1f} req/s  p50 {:>9.2f}ms  p95 {:>9.2f}ms  {} errors'.format(
+                    mode, count, result['throughput'], result['p50_ms'] or 0,
+                    result['p95_ms'] or 0, result['errors']))
+        finally:
+            server.terminate()
+            server.wait()
+    return results
@@ -0,0 +1,50 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from formatting import FORMATS, format_cached, format_datetime
+
+
+#----------------------------------------------------------------------------#
+# Datetime formatting.
+#----------------------------------------------------------------------------#
+
+def start_times(rows, seed=0):
+    # Evening slots over two years, like the seeded catalog.
+    generator = random.Random(seed)
+    now = datetime.now()
+    return [(now + timedelta(days=generator.randint(-365, 365))).replace(
+        hour=generator.randint(18, 23), minute=generator.choice((0, 30)), second=0, microsecond=0)
+        for _ in range(rows)]
+
+
+def previous(value, format):
+    # What every row cost before: strftime in the serializer, then dateutil
+    # and a full babel.dates.format_datetime in the template filter.
+    text = datetime.strftime(value, '%Y-%m-%d %H:%M:%S')
+    return babel.dates.format_datetime(dateutil.parser.parse(text), FORMATS[format])
+
+
+def per_row(formatter, values, format):
+    started = time.perf_counter()
+    for value in values:
+        formatter(value, format)
+    return (time.perf_counter() - started) / len(values) * 1e6
+
+
+def run(rows=10000, format='full', echo=print):
+    values = start_times(rows)
+    results = {'previous_us': per_row(previous, values, format)}
+    format_cached.cache_clear()
+    results['cold_us'] = per_row(format_datetime, values, format)
+    results['warm_us'] = per_row(format_datetime, values, format)
+    echo('{} rows, {} distinct start times'.format(rows, len(set(values))))
+    for name, label in (('previous_us', 'strftime + dateutil + babel'),
+                        ('cold_us', 'format_datetime, empty cache'),
+                        ('warm_us', 'format_datetime, warm cache')):
+        echo('{:<30} {:>8.2f} us/row  ({:.1f}x)'.format(
+            label, results[name], results['previous_us'] / results[name]))
+    return results
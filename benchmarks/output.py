@@ -0,0 +1,77 @@
+import time
+
+from flask import current_app
+
+from benchmarks.routes import percentile
+from cache import NullBackend, response_cache
+from output import brotli
+
+PATHS = ['/venues', '/artists', '/shows']
+
+# Buffered and uncompressed, the way every page was sent before, then
+# streamed with each encoding a browser would negotiate.
+MODES = [
+    ('buffered', False, 'identity'),
+    ('streamed', True, 'identity'),
+    ('streamed+gzip', True, 'gzip'),
+    ('streamed+br', True, 'br'),
+]
+
+
+#----------------------------------------------------------------------------#
+# Time to first byte and bytes on the wire.
+#----------------------------------------------------------------------------#
+
+def fetch(client, path, encoding):
+    # In process, so the first byte is the first chunk the WSGI app yields
+    # rather than one read off a socket.
+    started = time.perf_counter()
+    response = client.get(path, headers={'Accept-Encoding': encoding}, buffered=False)
+    first, size = None, 0
+    try:
+        for chunk in response.response:
+            if first is None:
+                first = time.perf_counter()
+            size += len(chunk)
+    finally:
+        response.close()
+    finished = time.perf_counter()
+    return (first or finished) - started, finished - started, size
+
+
+def measure(client, path, encoding, iterations):
+    ttfb, total, size = [], [], 0
+    for _ in range(iterations):
+        first, elapsed, size = fetch(client, path, encoding)
+        ttfb.append(first * 1000)
+        total.append(elapsed * 1000)
+    return {
+        'ttfb_p50_ms': round(percentile(ttfb, 0.50), 2),
+        'total_p50_ms': round(percentile(total, 0.50), 2),
+        'bytes': size,
+    }
+
+
+def run(page_size=1000, iterations=20, echo=print):
+    config = current_app.config
+    saved = dict((name, config[name]) for name in ('PAGE_SIZE', 'STREAM_TEMPLATES', 'ENFORCE_STATEMENT_BUDGETS'))
+    backend = response_cache.backend
+    config['PAGE_SIZE'] = page_size
+    config['ENFORCE_STATEMENT_BUDGETS'] = False
+    response_cache.backend = NullBackend()
+    client = current_app.test_client()
+    results = {}
+    try:
+        for path in PATHS:
+            for mode, streamed, encoding in MODES:
+                if encoding == 'br' and brotli is None:
+                    continue
+                config['STREAM_TEMPLATES'] = streamed
+                fetch(client, path, encoding)
+                results['{} {}'.format(path, mode)] = result = measure(client, path, encoding, iterations)
+                echo('{:<9} {:<14} ttfb {ttfb_p50_ms:>8.2f}ms  total {total_p50_ms:>8.2f}ms  '
+                     '{bytes:>10} bytes'.format(path, mode, **result))
+    finally:
+        config.update(saved)
+        response_cache.backend = backend
+    return results
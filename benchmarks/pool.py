@@ -0,0 +1,109 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from flask import current_app
+
+from extensions import db
+from benchmarks.routes import percentile
+from cache import NullBackend, response_cache
+from models import Venue, Artist
+
+
+#----------------------------------------------------------------------------#
+# Concurrent load.
+#----------------------------------------------------------------------------#
+
+def mixed_requests():
+    # A read-heavy mix: listings, detail pages and a search.
+    venue = Venue.query.order_by(Venue.id).first()
+    artist = Artist.query.order_by(Artist.id).first()
+    requests = [('GET', '/venues', None), ('GET', '/shows', None), ('GET', '/artists', None)]
+    if venue is not None:
+        requests.append(('GET', '/venues/{}'.format(venue.id), None))
+        requests.append(('POST', '/venues/search', {'search_term': venue.name[:4]}))
+    if artist is not None:
+        requests.append(('GET', '/artists/{}'.format(artist.id), None))
+    return requests
+
+
+def load(threads, duration):
+    # Runs `threads` clients against the app for `duration` seconds, each
+    # holding a pooled connection for the length of its requests.
+    current_app.config['WTF_CSRF_ENABLED'] = False
+    current_app.config['ENFORCE_STATEMENT_BUDGETS'] = False
+    response_cache.backend = NullBackend()
+    requests = mixed_requests()
+    # Hand the setup connection back so every client competes for the pool.
+    db.session.remove()
+    app = current_app._get_current_object()
+    lock = threading.Lock()
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+
+    def client_loop(offset):
+        client = app.test_client()
+        done, failed, position = [], [], offset
+        while time.perf_counter() < deadline:
+            method, url, data = requests[position % len(requests)]
+            position += 1
+            started = time.perf_counter()
+            try:
+                response = client.open(url, method=method, data=data)
+                error = 'HTTP {}'.format(response.status_code) if response.status_code >= 500 else None
+            except Exception as e:
+                # Pool timeouts surface here in debug mode.
+                error = type(e).__name__
+            if error is None:
+                done.append((time.perf_counter() - started) * 1000)
+            else:
+                failed.append(error)
+        with lock:
+            latencies.extend(done)
+            errors.extend(failed)
+
+    workers = [threading.Thread(target=client_loop, args=(number,)) for number in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    db.engine.dispose()
+
+    return {
+        'threads': threads,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'error_types': sorted(set(errors)),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50), 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95), 2) if latencies else None,
+    }
+
+
+#----------------------------------------------------------------------------#
+# Pool settings.
+#----------------------------------------------------------------------------#
+
+def run(settings, threads, duration, echo=print):
+    # config.py reads the pool settings from the environment when it is
+    # imported, so each combination is measured in a fresh interpreter.
+    results = []
+    for pool_size, max_overflow, timeout in settings:
+        environment = dict(os.environ, DB_POOL_SIZE=str(pool_size),
+                           DB_MAX_OVERFLOW=str(max_overflow), DB_POOL_TIMEOUT=str(timeout))
+        output = subprocess.check_output(
+            [sys.executable, '-m', 'benchmarks', 'pool-load',
+             '--threads', str(threads), '--duration', str(duration)],
+            env=environment)
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        result.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=timeout)
+        results.append(result)
+        echo('pool {:>3} + {:>3} overflow, {:>3} threads: {:>8.1f} req/s  p95 {:>8.2f}ms  {} errors {}'.format(
+            pool_size, max_overflow, threads, result['throughput'], result['p95_ms'] or 0,
+            result['errors'], ', '.join(result['error_types'])))
+    return results
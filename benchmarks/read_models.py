@@ -0,0 +1,75 @@
+import time
+import tracemalloc
+
+from extensions import db
+from models import Artist, Show
+from queries import ARTIST_ORDER, SHOW_ORDER, shows_query
+from read_models import Summary, ShowSummary, artist_summaries, show_summaries, fetch
+
+
+#----------------------------------------------------------------------------#
+# ORM entities against projected records.
+#----------------------------------------------------------------------------#
+
+def orm_artists(rows):
+    return list(map(Artist.shortDetails, Artist.query.order_by(*ARTIST_ORDER).limit(rows)))
+
+
+def projected_artists(rows):
+    return fetch(artist_summaries().order_by(*ARTIST_ORDER).limit(rows), Summary)
+
+
+def orm_shows(rows):
+    return list(map(Show.details, shows_query().order_by(*SHOW_ORDER).limit(rows)))
+
+
+def projected_shows(rows):
+    return fetch(show_summaries().order_by(*SHOW_ORDER).limit(rows), ShowSummary)
+
+
+PATHS = [
+    ('artists', 'orm', orm_artists),
+    ('artists', 'projected', projected_artists),
+    ('shows', 'orm', orm_shows),
+    ('shows', 'projected', projected_shows),
+]
+
+
+def measure(loader, rows, repeat):
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        count = len(loader(rows))
+        timings.append(time.perf_counter() - started)
+        db.session.rollback()
+
+    # Memory in a separate pass; the records are held until the peak is read.
+    db.session.expunge_all()
+    tracemalloc.start()
+    try:
+        records = loader(rows)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del records
+    db.session.rollback()
+    return count, min(timings), peak
+
+
+def run(rows=100000, repeat=3, echo=print):
+    # Results are scaled to 100k rows when the tables hold fewer.
+    results = {}
+    for page, path, loader in PATHS:
+        count, elapsed, peak = measure(loader, rows, repeat)
+        if not count:
+            continue
+        scale = 100000.0 / count
+        results['{}_{}'.format(page, path)] = result = {
+            'rows': count,
+            'ms_per_100k': round(elapsed * scale * 1000, 1),
+            'mib_per_100k': round(peak * scale / (1024 * 1024), 1),
+        }
+        echo('{:<8} {:<10} {:>7} rows  {:>9.1f} ms/100k rows  {:>8.1f} MiB/100k rows'.format(
+            page, path, count, result['ms_per_100k'], result['mib_per_100k']))
+    return results
@@ -0,0 +1,177 @@
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import event
+
+from extensions import db
+from cache import NullBackend, response_cache
+from models import Venue, Artist, Show
+from query_plans import next_page
+
+
+#----------------------------------------------------------------------------#
+# Routes.
+#----------------------------------------------------------------------------#
+
+def route_requests(client):
+    # Every view in app.py that renders a page, with real ids and the second
+    # page of each listing so the keyset seek is timed too.
+    venue = Venue.query.order_by(Venue.id).first()
+    artist = Artist.query.order_by(Artist.id).first()
+    requests = [
+        ('index', 'GET', '/', None),
+        ('venues', 'GET', '/venues', None),
+        ('artists', 'GET', '/artists', None),
+        ('shows', 'GET', '/shows', None),
+        ('create_venue_form', 'GET', '/venues/create', None),
+        ('create_artist_form', 'GET', '/artists/create', None),
+        ('create_shows', 'GET', '/shows/create', None),
+    ]
+    for name, url in (('venues', '/venues'), ('artists', '/artists'), ('shows', '/shows')):
+        following = next_page(client.get(url))
+        if following:
+            requests.append((name + '_next', 'GET', following, None))
+    if venue is not None:
+        requests += [
+            ('show_venue', 'GET', '/venues/{}'.format(venue.id), None),
+            ('edit_venue', 'GET', '/venues/{}/edit'.format(venue.id), None),
+            ('search_venues', 'POST', '/venues/search', {'search_term': venue.name[:4]}),
+        ]
+    if artist is not None:
+        requests += [
+            ('show_artist', 'GET', '/artists/{}'.format(artist.id), None),
+            ('edit_artist', 'GET', '/artists/{}/edit'.format(artist.id), None),
+            ('search_artists', 'POST', '/artists/search', {'search_term': artist.name[:4]}),
+        ]
+    return requests
+
+
+#----------------------------------------------------------------------------#
+# Measurement.
+#----------------------------------------------------------------------------#
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure(client, method, url, data, iterations, warmup):
+    statements = [0]
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements[0] += 1
+
+    for _ in range(warmup):
+        client.open(url, method=method, data=data)
+
+    latencies = []
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError('{} {} answered {}'.format(method, url, response.status_code))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+    # Memory is traced in a pass of its own; tracemalloc slows every
+    # allocation down and would skew the latencies.
+    tracemalloc.start()
+    try:
+        client.open(url, method=method, data=data)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'statements': statements[0] // iterations,
+        'peak_kib': round(peak / 1024.0, 1),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(iterations=100, warmup=5, use_cache=False, echo=print):
+    # Pages are rendered from the database unless `use_cache` is set, and
+    # the statement budgets stay out of the way of the timings.
+    current_app.config['WTF_CSRF_ENABLED'] = False
+    current_app.config['ENFORCE_STATEMENT_BUDGETS'] = False
+    backend = response_cache.backend
+    if not use_cache:
+        response_cache.backend = NullBackend()
+    client = current_app.test_client()
+    routes = {}
+    try:
+        for name, method, url, data in route_requests(client):
+            routes[name] = measure(client, method, url, data, iterations, warmup)
+            echo('{:<20} p50 {p50_ms:>8.2f}ms  p95 {p95_ms:>8.2f}ms  p99 {p99_ms:>8.2f}ms  '
+                 '{statements:>3} statements  {peak_kib:>8.1f} KiB'.format(name, **routes[name]))
+    finally:
+        response_cache.backend = backend
+    return {
+        'revision': git_revision(),
+        'created': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'database': db.engine.dialect.name,
+        'volume': {
+            'venues': Venue.query.count(),
+            'artists': Artist.query.count(),
+            'shows': Show.query.count(),
+        },
+        'iterations': iterations,
+        'cache': use_cache,
+        'routes': routes,
+    }
+
+
+#----------------------------------------------------------------------------#
+# Baselines.
+#----------------------------------------------------------------------------#
+
+def save(results, path):
+    with open(path, 'w') as handle:
+        json.dump(results, handle, indent=2, sort_keys=True)
+        handle.write('\n')
+
+
+def load(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def compare(baseline, results, threshold=0.2, echo=print):
+    # A route regresses when its p95 grows by more than `threshold` or it
+    # starts sending more statements; returns the names of those routes.
+    if baseline.get('volume') != results.get('volume'):
+        echo('Warning: baseline was taken against {} rows'.format(baseline.get('volume')))
+    regressions = []
+    for name, current in sorted(results['routes'].items()):
+        previous = baseline['routes'].get(name)
+        if previous is None:
+            continue
+        change = (current['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] if previous['p95_ms'] else 0
+        slower = change > threshold
+        chattier = current['statements'] > previous['statements']
+        echo('{:<20} p95 {:>8.2f}ms -> {:>8.2f}ms ({:+.0%})  statements {} -> {}{}'.format(
+            name, previous['p95_ms'], current['p95_ms'], change,
+            previous['statements'], current['statements'],
+            '  REGRESSION' if slower or chattier else ''))
+        if slower or chattier:
+            regressions.append(name)
+    return regressions
@@ -0,0 +1,132 @@
+import random
+from datetime import datetime, timedelta
+
+from extensions import db
+from cache import response_cache
+from forms import STATE, GENRES
+from importer import load_batch
+from models import Venue, Artist, Show
+from show_counts import rebuild
+
+
+#----------------------------------------------------------------------------#
+# Synthetic catalog.
+#----------------------------------------------------------------------------#
+
+CITY_NAMES = [
+    'Springfield', 'Franklin', 'Greenville', 'Bristol', 'Clinton', 'Fairview',
+    'Salem', 'Madison', 'Georgetown', 'Arlington', 'Ashland', 'Burlington',
+    'Manchester', 'Oxford', 'Jackson', 'Milton', 'Riverside', 'Dayton',
+]
+ADJECTIVES = ['Blue', 'Electric', 'Golden', 'Velvet', 'Midnight', 'Rusty', 'Silver',
+              'Wild', 'Neon', 'Hidden', 'Lucky', 'Crimson', 'Broken', 'Little']
+NOUNS = ['Room', 'Hall', 'Tavern', 'Lounge', 'Garden', 'Owl', 'Anchor', 'Fox',
+         'Pianos', 'Cellar', 'Theatre', 'Wolves', 'Petals', 'Echo']
+BATCH = 5000
+
+
+def zipf_weights(count, exponent=1.1):
+    # A few states, cities, genres and venues get most of the traffic, the
+    # way real catalogs skew.
+    return [1.0 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+class Catalog(object):
+
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+        self.states = [code for code, label in STATE]
+        self.random.shuffle(self.states)
+        self.state_weights = zipf_weights(len(self.states))
+        self.cities = dict(
+            (state, self.random.sample(CITY_NAMES, self.random.randint(2, 6)))
+            for state in self.states)
+        self.genres = [value for value, label in GENRES]
+        self.random.shuffle(self.genres)
+        self.genre_weights = zipf_weights(len(self.genres))
+
+    def place(self):
+        state = self.random.choices(self.states, self.state_weights)[0]
+        cities = self.cities[state]
+        return self.random.choices(cities, zipf_weights(len(cities)))[0], state
+
+    def pick_genres(self):
+        picked = set(self.random.choices(self.genres, self.genre_weights, k=self.random.randint(1, 3)))
+        return sorted(picked)
+
+    def name(self, number):
+        return 'The {} {} {}'.format(
+            self.random.choice(ADJECTIVES), self.random.choice(NOUNS), number)
+
+    def venue(self, number):
+        city, state = self.place()
+        return {
+            'name': self.name(number), 'city': city, 'state': state,
+            'address': '{} Main Street'.format(self.random.randint(1, 9999)),
+            'phone': '555-{:03d}-{:04d}'.format(self.random.randint(0, 999), self.random.randint(0, 9999)),
+            'genres': self.pick_genres(),
+            'website_link': 'https://example.com/venues/{}'.format(number),
+            'facebook_link': 'https://www.facebook.com/venue{}'.format(number),
+            'image_link': 'https://images.example.com/venues/{}.jpg'.format(number),
+            'seeking_talent': self.random.random() < 0.4,
+            'seeking_description': '',
+        }
+
+    def artist(self, number):
+        city, state = self.place()
+        return {
+            'name': self.name(number), 'city': city, 'state': state,
+            'phone': '555-{:03d}-{:04d}'.format(self.random.randint(0, 999), self.random.randint(0, 9999)),
+            'genres': self.pick_genres(),
+            'website_link': 'https://example.com/artists/{}'.format(number),
+            'facebook_link': 'https://www.facebook.com/artist{}'.format(number),
+            'image_link': 'https://images.example.com/artists/{}.jpg'.format(number),
+            'seeking_venue': self.random.random() < 0.3,
+            'seeking_description': '',
+        }
+
+    def shows(self, count, venue_ids, artist_ids, now):
+        # Popular venues and artists host far more shows than the long tail;
+        # start times spread a year either side of now, in the evening.
+        venue_weights = zipf_weights(len(venue_ids), 0.8)
+        artist_weights = zipf_weights(len(artist_ids), 0.8)
+        for offset in range(0, count, BATCH):
+            size = min(BATCH, count - offset)
+            venues = self.random.choices(venue_ids, venue_weights, k=size)
+            artists = self.random.choices(artist_ids, artist_weights, k=size)
+            yield [{
+                'venue_id': venue_id, 'artist_id': artist_id,
+                'start_time': (now + timedelta(days=self.random.randint(-365, 365))).replace(
+                    hour=self.random.randint(18, 23), minute=self.random.choice((0, 30)),
+                    second=0, microsecond=0),
+            } for venue_id, artist_id in zip(venues, artists)]
+
+
+def insert(model, rows):
+    for offset in range(0, len(rows), BATCH):
+        load_batch(model, rows[offset:offset + BATCH])
+
+
+def seed(venues, artists, shows, seed=0, echo=print):
+    catalog = Catalog(seed)
+    start = db.session.query(db.func.count(Venue.id)).scalar()
+    insert(Venue, [catalog.venue(start + number) for number in range(venues)])
+    echo('{} venues'.format(venues))
+    start = db.session.query(db.func.count(Artist.id)).scalar()
+    insert(Artist, [catalog.artist(start + number) for number in range(artists)])
+    echo('{} artists'.format(artists))
+
+    venue_ids = [row[0] for row in db.session.query(Venue.id).order_by(Venue.id)]
+    artist_ids = [row[0] for row in db.session.query(Artist.id).order_by(Artist.id)]
+    catalog.random.shuffle(venue_ids)
+    catalog.random.shuffle(artist_ids)
+    if venue_ids and artist_ids:
+        for batch in catalog.shows(shows, venue_ids, artist_ids, datetime.now()):
+            load_batch(Show, batch)
+        rebuild()
+        echo('{} shows'.format(shows))
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+    # Bulk loads bypass the session events that evict cached pages.
+    response_cache.clear()
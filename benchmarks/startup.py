@@ -0,0 +1,175 @@
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks.routes import percentile
+
+# Timed in a fresh interpreter each run, so nothing is already imported.
+FACTORY = '''
+import time
+started = time.perf_counter()
+from app import create_app
+app = create_app()
+print(time.perf_counter() - started)
+'''
+
+TEMPLATES = '''
+import time
+from app import create_app
+app = create_app()
+started = time.perf_counter()
+for name in app.jinja_env.list_templates(extensions=['html']):
+    app.jinja_env.get_template(name)
+print(time.perf_counter() - started)
+'''
+
+
+#----------------------------------------------------------------------------#
+# Factory and templates.
+#----------------------------------------------------------------------------#
+
+def timed_script(script, environment=None, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', script],
+                                         env=dict(os.environ, **(environment or {})))
+        timings.append(float(output.decode().strip().splitlines()[-1]) * 1000)
+    return round(percentile(timings, 0.50), 1)
+
+
+def template_timings(repeat):
+    # No cache, an empty cache (the first worker after a deploy), and a
+    # filled one (every worker after that).
+    directory = tempfile.mkdtemp(prefix='fyyur-jinja-')
+    try:
+        results = {'uncached_ms': timed_script(TEMPLATES, {'JINJA_BYTECODE_CACHE_DIR': ''}, repeat)}
+        cold = []
+        for _ in range(repeat):
+            shutil.rmtree(directory)
+            cold.append(timed_script(TEMPLATES, {'JINJA_BYTECODE_CACHE_DIR': directory}, 1))
+        results['cold_cache_ms'] = round(percentile(cold, 0.50), 1)
+        results['warm_cache_ms'] = timed_script(TEMPLATES, {'JINJA_BYTECODE_CACHE_DIR': directory}, repeat)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+#----------------------------------------------------------------------------#
+# Gunicorn workers.
+#----------------------------------------------------------------------------#
+
+def children(pid):
+    try:
+        with open('/proc/{0}/task/{0}/children'.format(pid)) as handle:
+            return [int(child) for child in handle.read().split()]
+    except OSError:
+        return []
+
+
+def memory(pid):
+    # Resident and proportional set sizes in KiB; PSS splits every shared
+    # page between the processes sharing it.
+    sizes = {}
+    try:
+        with open('/proc/{}/smaps_rollup'.format(pid)) as handle:
+            for line in handle:
+                name, _, value = line.partition(':')
+                if name in ('Rss', 'Pss'):
+                    sizes[name] = int(value.split()[0])
+    except OSError:
+        return None
+    return sizes
+
+
+def wait_for(port, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen('http://127.0.0.1:{}/'.format(port), timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            time.sleep(0.005)
+    return False
+
+
+def start_server(preload, workers, port):
+    environment = dict(os.environ, GUNICORN_PRELOAD='true' if preload else 'false',
+                       GUNICORN_WORKERS=str(workers), GUNICORN_THREADS='2',
+                       GUNICORN_BIND='127.0.0.1:{}'.format(port), GUNICORN_ACCESS_LOG='')
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not wait_for(port, started + 60):
+        server.terminate()
+        raise RuntimeError('gunicorn did not answer on port {}'.format(port))
+    return server, time.perf_counter() - started
+
+
+def boot(preload, workers, port):
+    server, first_response = start_server(preload, workers, port)
+    try:
+        deadline = time.perf_counter() + 60
+        while len(children(server.pid)) < workers and time.perf_counter() < deadline:
+            time.sleep(0.02)
+        # Let every worker serve a few pages before reading its memory.
+        for _ in range(workers * 4):
+            wait_for(port, time.perf_counter() + 5)
+        sizes = [size for size in map(memory, children(server.pid)) if size]
+    finally:
+        server.terminate()
+        server.wait()
+
+    result = {'preload': preload, 'first_response_ms': round(first_response * 1000, 1)}
+    if sizes:
+        rss = sum(size['Rss'] for size in sizes)
+        pss = sum(size['Pss'] for size in sizes)
+        result.update(rss_mib=round(rss / 1024.0, 1), pss_mib=round(pss / 1024.0, 1),
+                      shared=round(1 - float(pss) / rss, 2))
+    return result
+
+
+def respawn(preload, port, repeat):
+    # A lone worker is killed and the clock runs until the page is served
+    # again: what a crash or a max_requests recycle costs.
+    server, _ = start_server(preload, 1, port)
+    timings = []
+    try:
+        for _ in range(repeat):
+            os.kill(children(server.pid)[0], signal.SIGKILL)
+            started = time.perf_counter()
+            if not wait_for(port, started + 60):
+                raise RuntimeError('worker did not come back')
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        server.terminate()
+        server.wait()
+    return round(percentile(timings, 0.50), 1)
+
+
+#----------------------------------------------------------------------------#
+# Benchmark.
+#----------------------------------------------------------------------------#
+
+def run(repeat=5, workers=4, port=8766, echo=print):
+    results = {'factory_ms': timed_script(FACTORY, repeat=repeat)}
+    echo('import + create_app             {:>8.1f} ms'.format(results['factory_ms']))
+    results['templates'] = template_timings(repeat)
+    for name, label in (('uncached_ms', 'no bytecode cache'), ('cold_cache_ms', 'empty bytecode cache'),
+                        ('warm_cache_ms', 'warm bytecode cache')):
+        echo('templates, {:<20} {:>8.1f} ms'.format(label, results['templates'][name]))
+    results['gunicorn'] = []
+    for preload in (False, True):
+        result = boot(preload, workers, port)
+        result['respawn_ms'] = respawn(preload, port, repeat)
+        results['gunicorn'].append(result)
+        echo('gunicorn preload={:<5}  first response {:>7.1f} ms  worker respawn {:>7.1f} ms  '
+             'RSS {} MiB  PSS {} MiB  ({:.0%} shared)'.format(
+                 str(preload), result['first_response_ms'], result['respawn_ms'],
+                 result.get('rss_mib'), result.get('pss_mib'), result.get('shared', 0)))
+    return results
@@ -0,0 +1,60 @@
+import random
+import time
+
+from benchmarks.routes import percentile
+from benchmarks.seed import Catalog
+from typeahead import PrefixIndex
+
+
+#----------------------------------------------------------------------------#
+# Prefix index.
+#----------------------------------------------------------------------------#
+
+def catalog_rows(entities, seed=0):
+    catalog = Catalog(seed)
+    return [(number, catalog.name(number)) + catalog.place() for number in range(1, entities + 1)]
+
+
+def prefixes(rows, lookups, seed=0):
+    # What a user has typed so far: the first one to eight characters of a
+    # name or of one of its words.
+    generator = random.Random(seed)
+    typed = []
+    for _ in range(lookups):
+        words = generator.choice(rows)[1].split(' ')
+        start = ' '.join(words[generator.randrange(len(words)):])
+        typed.append(start[:generator.randint(1, 8)])
+    return typed
+
+
+def timed(operation, values):
+    latencies = []
+    for value in values:
+        started = time.perf_counter()
+        operation(value)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def summary(latencies):
+    return dict(('{}_ms'.format(name), round(percentile(latencies, fraction), 4))
+                for name, fraction in (('p50', 0.50), ('p99', 0.99), ('max', 1.0)))
+
+
+def run(entities=100000, lookups=10000, limit=10, echo=print):
+    rows = catalog_rows(entities)
+    started = time.perf_counter()
+    index = PrefixIndex(rows)
+    results = {'build_ms': round((time.perf_counter() - started) * 1000, 1)}
+    echo('{} entities, index built in {} ms'.format(len(index), results['build_ms']))
+
+    results['lookup'] = summary(timed(lambda prefix: index.lookup(prefix, limit),
+                                      prefixes(rows, lookups)))
+    # Renames as the commit hook applies them: remove, then insert.
+    renamed = [(doc_id, name + ' Revisited', city, state)
+               for doc_id, name, city, state in random.Random(1).sample(rows, min(1000, entities))]
+    results['update'] = summary(timed(lambda row: index.add(*row), renamed))
+    for name in ('lookup', 'update'):
+        echo('{:<8} p50 {p50_ms:>8.4f} ms  p99 {p99_ms:>8.4f} ms  max {max_ms:>8.4f} ms'.format(
+            name, **results[name]))
+    return results
@@ -0,0 +1,423 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+from functools import wraps
+
+from flask import Response, g, request, session
+from sqlalchemy import event, inspect
+
+from extensions import db
+from models import Venue, Artist, Show
+from output import masked_csrf_token
+
+
+CachedResponse = namedtuple('CachedResponse', ['status', 'mimetype', 'body'])
+
+# Tag recorded by clear(): every page counts as invalidated.
+EVERYTHING = '*'
+
+# Rendered pages embed the visitor's masked CSRF token in the search form;
+# it is swapped for this marker on the way in and for a freshly masked
+# current token on a hit.
+CSRF_PLACEHOLDER = b'__fyyur_csrf_token__'
+
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+class NullBackend(object):
+    shared = True
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, tags, ttl):
+        pass
+
+    def invalidate(self, tags):
+        pass
+
+    def clear(self):
+        pass
+
+    def invalidated_since(self, tags, since):
+        return False
+
+
+class MemoryBackend(object):
+    # Per-process LRU with TTL. Invalidation only reaches the process that
+    # made the write; use the sqlite backend to share a cache across workers.
+    # clear() also replaces the generation file, and every process on the
+    # host drops its entries when it sees a new one, so a bulk load run
+    # from the CLI still empties the workers' caches.
+    shared = False
+
+    def __init__(self, max_entries=1000, generation_path=None, window=0):
+        self.max_entries = max_entries
+        self.generation_path = generation_path
+        self.window = window
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.tags = defaultdict(set)
+        # When each tag was last invalidated, oldest first, for `window`
+        # seconds.
+        self.stamps = OrderedDict()
+        self.generation = self.read_generation()
+
+    def read_generation(self):
+        if self.generation_path is None:
+            return None
+        try:
+            stat = os.stat(self.generation_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _sync(self):
+        # Called with the lock held.
+        generation = self.read_generation()
+        if generation != self.generation:
+            self.generation = generation
+            self.entries.clear()
+            self.tags.clear()
+            self._stamp([EVERYTHING])
+
+    def _stamp(self, tags):
+        # Called with the lock held.
+        now = time.time()
+        for tag in tags:
+            self.stamps.pop(tag, None)
+            self.stamps[tag] = now
+        while self.stamps and next(iter(self.stamps.values())) < now - self.window:
+            self.stamps.popitem(last=False)
+
+    def get(self, key):
+        with self.lock:
+            self._sync()
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value, tags = entry
+            if expires < time.time():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags, ttl):
+        with self.lock:
+            self._sync()
+            self._remove(key)
+            self.entries[key] = (time.time() + ttl, value, tags)
+            for tag in tags:
+                self.tags[tag].add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, tags):
+        with self.lock:
+            for tag in tags:
+                for key in list(self.tags.get(tag, ())):
+                    self._remove(key)
+            self._stamp(tags)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+            self._stamp([EVERYTHING])
+            if self.generation_path is not None:
+                # A new file rather than a rewrite: the inode changes even
+                # where mtimes are coarse.
+                temporary = '{}.{}'.format(self.generation_path, os.getpid())
+                with open(temporary, 'w') as handle:
+                    handle.write(repr(time.time()))
+                os.replace(temporary, self.generation_path)
+                self.generation = self.read_generation()
+
+    def invalidated_since(self, tags, since):
+        with self.lock:
+            self._sync()
+            return any(self.stamps.get(tag, 0) >= since for tag in list(tags) + [EVERYTHING])
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+
+class SQLiteBackend(object):
+    # File backed LRU with TTL that every worker on the host can share, so an
+    # invalidation made by one worker is seen by all of them.
+    shared = True
+
+    def __init__(self, path, max_entries=1000, window=0):
+        self.path = path
+        self.max_entries = max_entries
+        self.window = window
+        self.local = threading.local()
+        with self.connection() as connection:
+            connection.executescript('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY, status INTEGER, mimetype TEXT,
+                    body BLOB, expires REAL, accessed REAL);
+                CREATE INDEX IF NOT EXISTS ix_entries_accessed ON entries (accessed);
+                CREATE TABLE IF NOT EXISTS tags (
+                    tag TEXT, key TEXT, PRIMARY KEY (tag, key));
+                CREATE INDEX IF NOT EXISTS ix_tags_key ON tags (key);
+                CREATE TABLE IF NOT EXISTS stamps (tag TEXT PRIMARY KEY, invalidated REAL);
+            ''')
+
+    def connection(self):
+        # One connection per thread, reopened after a fork.
+        if getattr(self.local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    def get(self, key):
+        now = time.time()
+        with self.connection() as connection:
+            row = connection.execute(
+                'SELECT status, mimetype, body, expires FROM entries WHERE key = ?',
+                (key,)).fetchone()
+            if row is None:
+                return None
+            if row[3] < now:
+                self._remove(connection, [key])
+                return None
+            connection.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+        return CachedResponse(row[0], row[1], bytes(row[2]))
+
+    def set(self, key, value, tags, ttl):
+        now = time.time()
+        with self.connection() as connection:
+            self._remove(connection, [key])
+            connection.execute(
+                'INSERT INTO entries (key, status, mimetype, body, expires, accessed) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, value.status, value.mimetype, value.body, now + ttl, now))
+            connection.executemany(
+                'INSERT OR IGNORE INTO tags (tag, key) VALUES (?, ?)',
+                [(tag, key) for tag in tags])
+            overflow = connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0] - self.max_entries
+            if overflow > 0:
+                stale = connection.execute(
+                    'SELECT key FROM entries ORDER BY accessed LIMIT ?', (overflow,)).fetchall()
+                self._remove(connection, [row[0] for row in stale])
+
+    def invalidate(self, tags):
+        tags = list(tags)
+        if not tags:
+            return
+        with self.connection() as connection:
+            keys = connection.execute(
+                'SELECT DISTINCT key FROM tags WHERE tag IN ({})'.format(','.join('?' * len(tags))),
+                tags).fetchall()
+            self._remove(connection, [row[0] for row in keys])
+            self._stamp(connection, tags)
+
+    def clear(self):
+        with self.connection() as connection:
+            connection.execute('DELETE FROM entries')
+            connection.execute('DELETE FROM tags')
+            self._stamp(connection, [EVERYTHING])
+
+    def invalidated_since(self, tags, since):
+        tags = list(tags) + [EVERYTHING]
+        with self.connection() as connection:
+            return connection.execute(
+                'SELECT 1 FROM stamps WHERE invalidated >= ? AND tag IN ({}) LIMIT 1'.format(
+                    ','.join('?' * len(tags))),
+                [since] + tags).fetchone() is not None
+
+    def _stamp(self, connection, tags):
+        now = time.time()
+        connection.executemany('INSERT OR REPLACE INTO stamps (tag, invalidated) VALUES (?, ?)',
+                               [(tag, now) for tag in tags])
+        connection.execute('DELETE FROM stamps WHERE invalidated < ?', (now - self.window,))
+
+    def _remove(self, connection, keys):
+        connection.executemany('DELETE FROM entries WHERE key = ?', [(key,) for key in keys])
+        connection.executemany('DELETE FROM tags WHERE key = ?', [(key,) for key in keys])
+
+
+#----------------------------------------------------------------------------#
+# Response cache.
+#----------------------------------------------------------------------------#
+
+class ResponseCache(object):
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.ttl = 0
+        self.window = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        name = app.config['RESPONSE_CACHE_BACKEND']
+        max_entries = app.config['RESPONSE_CACHE_MAX_ENTRIES']
+        # Invalidations are remembered for as long as a replica may lag.
+        window = app.config['READ_YOUR_WRITES_WINDOW']
+        if name == 'memory':
+            self.backend = MemoryBackend(
+                max_entries, app.config['RESPONSE_CACHE_GENERATION_PATH'], window)
+        elif name == 'sqlite':
+            self.backend = SQLiteBackend(app.config['RESPONSE_CACHE_PATH'], max_entries, window)
+        elif name == 'none':
+            self.backend = NullBackend()
+        else:
+            raise ValueError('Unknown response cache backend: {}'.format(name))
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+        self.window = window
+
+    def tag(self, *tags):
+        # Lets a view add tags for the rows it actually rendered.
+        g.setdefault('cache_tags', set()).update(tags)
+
+    def cached(self, *tags):
+        # Caches a GET view under its full path. `tags` are format strings
+        # over the view arguments, e.g. 'venue:{venue_id}'.
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # Pending flash messages are rendered into the page, so such
+                # requests neither read from nor write to the cache.
+                if request.method != 'GET' or session.get('_flashes'):
+                    return view(*args, **kwargs)
+
+                key = request.full_path
+                hit = self.backend.get(key)
+                if hit is not None:
+                    body = hit.body
+                    if CSRF_PLACEHOLDER in body:
+                        body = body.replace(CSRF_PLACEHOLDER, masked_csrf_token().encode('ascii'))
+                    return Response(body, status=hit.status, mimetype=hit.mimetype)
+
+                g.cache_tags = set(tag.format(**kwargs) for tag in tags)
+                response = view(*args, **kwargs)
+                token = g.get('masked_csrf_token')
+                # A streamed page may still be reading when it is stored.
+                state = g._get_current_object()
+                if isinstance(response, str):
+                    self.store(key, response.encode('utf-8'), g.cache_tags, token, state)
+                elif isinstance(response, Response) and response.is_streamed \
+                        and response.status_code == 200:
+                    response.response = self.teed(
+                        key, response.response, g.cache_tags, token, state)
+                return response
+            return wrapper
+        return decorator
+
+    def store(self, key, body, tags, token, state):
+        # Right after a write the replicas may not have it yet: a page read
+        # from one is served but not stored while any of its tags was
+        # invalidated within the lag window, or the stale copy would
+        # outlive the invalidation by the whole TTL.
+        if state.get('replica') is not None and \
+                self.backend.invalidated_since(tags, time.time() - self.window):
+            return
+        if token is not None:
+            body = body.replace(token.encode('ascii'), CSRF_PLACEHOLDER)
+        self.backend.set(key, CachedResponse(200, 'text/html', body), tags, self.ttl)
+
+    def teed(self, key, chunks, tags, token, state):
+        # A streamed page is stored once its last chunk has gone out; one
+        # cut short by a disconnect never is.
+        body = []
+        try:
+            for chunk in chunks:
+                body.append(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+                yield chunk
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        self.store(key, b''.join(body), tags, token, state)
+
+    def invalidate(self, tags, everywhere=False):
+        # Writes made outside the server (CLI commands, cron) pass
+        # `everywhere`: a per-process backend cannot reach the workers'
+        # entries by tag, so it is cleared on every process instead.
+        if everywhere and not self.backend.shared:
+            self.backend.clear()
+        else:
+            self.backend.invalidate(tags)
+
+    def clear(self):
+        self.backend.clear()
+
+
+response_cache = ResponseCache()
+
+
+#----------------------------------------------------------------------------#
+# Invalidation.
+#----------------------------------------------------------------------------#
+
+def _changed(instance, *attributes):
+    state = inspect(instance)
+    return any(state.attrs[attribute].history.has_changes() for attribute in attributes)
+
+
+def _previous(instance, attribute):
+    # Current value plus whatever the attribute held before this flush.
+    history = inspect(instance).attrs[attribute].history
+    return set(value for value in history.sum() if value is not None)
+
+
+def write_tags(instance, created=False, deleted=False):
+    # Pages are tagged with the ids of every venue, artist and show they
+    # render; these are the tags a write to `instance` makes stale.
+    if isinstance(instance, Venue):
+        tags = {'venue:{}'.format(instance.id)}
+        if created or deleted or _changed(instance, 'city', 'state'):
+            tags.add('venues')
+        return tags
+    if isinstance(instance, Artist):
+        tags = {'artist:{}'.format(instance.id)}
+        if created or deleted:
+            tags.add('artists')
+        return tags
+    if isinstance(instance, Show):
+        tags = {'shows'}
+        tags.update('venue:{}'.format(venue_id) for venue_id in _previous(instance, 'venue_id'))
+        tags.update('artist:{}'.format(artist_id) for artist_id in _previous(instance, 'artist_id'))
+        return tags
+    return set()
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_tags(session, flush_context):
+    tags = session.info.setdefault('cache_tags', set())
+    for instance in session.new:
+        tags.update(write_tags(instance, created=True))
+    for instance in session.dirty:
+        if session.is_modified(instance):
+            tags.update(write_tags(instance))
+    for instance in session.deleted:
+        tags.update(write_tags(instance, deleted=True))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_tags(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        response_cache.invalidate(tags)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_tags(session):
+    session.info.pop('cache_tags', None)
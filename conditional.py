@@ -0,0 +1,63 @@
+import hashlib
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Response, current_app, make_response, request, session
+
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+def page_etag(fingerprint):
+    # Pages embed the visitor's CSRF token, so the ETag is bound to the
+    # session's token and rolls over every half of the token lifetime so
+    # a revalidated page never carries an expired token.
+    lifetime = current_app.config.get('WTF_CSRF_TIME_LIMIT') or 3600
+    token = session.get(current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token'))
+    window = int(time.time() // (lifetime // 2))
+    source = repr((fingerprint, token, window)).encode('utf-8')
+    return hashlib.sha1(source).hexdigest()
+
+
+def conditional(validator):
+    # Answers 304 Not Modified from `validator` alone, before the view runs
+    # its queries or renders anything. `validator` is called with the view
+    # arguments and returns (fingerprint, last_modified) or None.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+            state = validator(*args, **kwargs)
+            if state is None:
+                return view(*args, **kwargs)
+
+            fingerprint, last_modified = state
+            etag = page_etag(fingerprint)
+            if request.if_none_match:
+                # Weak comparison: compressed responses carry a weak ETag.
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                not_modified = (last_modified is not None
+                                and request.if_modified_since is not None
+                                and last_modified.replace(microsecond=0)
+                                <= request.if_modified_since.replace(tzinfo=None))
+
+            if not_modified:
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                # Rendering may have just issued the session's CSRF token.
+                etag = page_etag(fingerprint)
+            response.set_etag(etag)
+            # HTTP dates have one second resolution, so a timestamp from the
+            # current second could still be followed by another write.
+            if last_modified is not None and last_modified < datetime.utcnow() - timedelta(seconds=1):
+                response.last_modified = last_modified
+            # Shared caches may store the page but must revalidate each time.
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,12 @@
+from flask_migrate import Migrate
+from flask_moment import Moment
+
+from output import MaskedCSRFProtect
+from replicas import RoutingSQLAlchemy
+
+# Created unbound so every module can import them; create_app() in app.py
+# binds them to the application.
+csrf = MaskedCSRFProtect()
+db = RoutingSQLAlchemy()
+migrate = Migrate()
+moment = Moment()
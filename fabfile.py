@@ -1,3 +1,5 @@
+import os
+
 from fabric.api import local, settings, abort
 from fabric.contrib.console import confirm
 
@@ -5,11 +7,18 @@ from fabric.contrib.console import confirm
 
 
 def test():
+    bench()
+
+
+def bench(baseline="benchmarks/baseline.json"):
+    # Times every page against the local database and compares it with the
+    # last saved baseline; the first run only records one.
+    if not os.path.exists(baseline):
+        local("python -m benchmarks routes --save {}".format(baseline))
+        return
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
-    if result.failed and not confirm("Tests failed. Continue?"):
+        result = local("python -m benchmarks routes --compare {}".format(baseline))
+    if result.failed and not confirm("Benchmarks regressed. Continue?"):
         abort("Aborted at user request.")
 
 
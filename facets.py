@@ -0,0 +1,192 @@
+from collections import defaultdict, namedtuple
+
+from flask import current_app
+
+from extensions import db
+from models import Venue, Artist, Genre, GENRE_LINKS
+from pagination import paginate
+from read_models import SearchResult, fetch
+from search import relevance, term_conditions
+
+# The "seeking" flag of each model: venues seek talent, artists a venue.
+SEEKING = {Venue: Venue.seeking_talent, Artist: Artist.seeking_venue}
+
+# Facet dimensions, in the argument order of GROUPING(); each grouping set
+# leaves the other columns aggregated, which sets their bits in the mask.
+DIMENSIONS = ('state', 'city', 'genre', 'seeking')
+GROUPING_MASKS = {0b0111: 'state', 0b0011: 'city', 0b1101: 'genre', 0b1110: 'seeking'}
+
+Facet = namedtuple('Facet', ['label', 'count', 'args'])
+
+Results = namedtuple('Results', ['count', 'data', 'facets', 'page'])
+
+
+#----------------------------------------------------------------------------#
+# Filters.
+#----------------------------------------------------------------------------#
+
+class Filters(object):
+    # Everything a faceted search is narrowed by. Round-trips through the
+    # query string so facet and pager links keep the current filters.
+
+    def __init__(self, term='', state=None, city=None, genres=(), seeking=False):
+        self.term = term
+        self.state = state
+        self.city = city
+        self.genres = tuple(genres)
+        self.seeking = seeking
+
+    @classmethod
+    def from_values(cls, values):
+        return cls(
+            term=(values.get('search_term') or '').strip(),
+            state=values.get('state') or None,
+            city=values.get('city') or None,
+            genres=[genre for genre in values.getlist('genre') if genre],
+            seeking=values.get('seeking') == 'y')
+
+    def args(self, **changes):
+        values = {
+            'search_term': self.term,
+            'state': self.state,
+            'city': self.city,
+            'genre': list(self.genres),
+            'seeking': 'y' if self.seeking else None,
+        }
+        values.update(changes)
+        return dict((name, value) for name, value in values.items() if value)
+
+    def conditions(self, model):
+        # All filters must hold; within the term, any field may match.
+        conditions = []
+        if self.term:
+            conditions.append(db.or_(*term_conditions(model, self.term)))
+        if self.state:
+            conditions.append(model.state == self.state)
+        if self.city:
+            conditions.append(model.city == self.city)
+        for genre in self.genres:
+            conditions.append(model.genre_list.any(Genre.name == genre))
+        if self.seeking:
+            conditions.append(SEEKING[model].is_(True))
+        return conditions
+
+
+#----------------------------------------------------------------------------#
+# Facet counts.
+#----------------------------------------------------------------------------#
+
+def facet_source(model, columns, filters):
+    # The filtered rows joined out to their genres; a venue with three
+    # genres appears three times, so every count is a distinct count.
+    owner = GENRE_LINKS[model]
+    return db.select(columns).select_from(
+        model.__table__.outerjoin(owner.table, owner == model.id)
+                       .outerjoin(Genre.__table__, Genre.id == owner.table.c.genre_id)
+    ).where(*filters.conditions(model))
+
+
+def _postgres_counts(model, filters):
+    # One scan of the filtered rows feeds every dimension at once.
+    columns = (model.state, model.city, Genre.name, SEEKING[model])
+    query = facet_source(
+        model, [db.func.grouping(*columns)] + list(columns) + [db.func.count(db.distinct(model.id))],
+        filters
+    ).group_by(db.func.grouping_sets(
+        db.tuple_(model.state),
+        db.tuple_(model.state, model.city),
+        db.tuple_(Genre.name),
+        db.tuple_(SEEKING[model]),
+    ))
+    counts = defaultdict(dict)
+    for mask, state, city, genre, seeking, count in db.session.execute(query):
+        dimension = GROUPING_MASKS[mask]
+        value = {'state': state, 'city': (city, state), 'genre': genre, 'seeking': seeking}[dimension]
+        counts[dimension][value] = count
+    return counts
+
+
+def _fallback_counts(model, filters):
+    # Dialects without GROUPING SETS (SQLite) count the same rows here.
+    query = facet_source(model, [model.id, model.state, model.city, Genre.name, SEEKING[model]],
+                         filters)
+    members = defaultdict(lambda: defaultdict(set))
+    for row_id, state, city, genre, seeking in db.session.execute(query):
+        members['state'][state].add(row_id)
+        members['city'][city, state].add(row_id)
+        members['genre'][genre].add(row_id)
+        members['seeking'][seeking].add(row_id)
+    return dict((dimension, dict((value, len(ids)) for value, ids in values.items()))
+                for dimension, values in members.items())
+
+
+def facet_counts(model, filters):
+    if db.read_dialect() == 'postgresql':
+        counts = _postgres_counts(model, filters)
+    else:
+        counts = _fallback_counts(model, filters)
+    # Every row lands in exactly one state group, NULL included.
+    total = sum(counts.get('state', {}).values())
+    return total, counts
+
+
+def facet_links(counts, filters, limit):
+    # The most common values of each dimension, each with the arguments of
+    # a search narrowed to it; values already filtered on are left out.
+    facets = {}
+    for dimension in DIMENSIONS:
+        values = [(value, count) for value, count in counts.get(dimension, {}).items()
+                  if value is not None and value is not False]
+        values.sort(key=lambda item: (-item[1], str(item[0])))
+        links = []
+        for value, count in values:
+            if dimension == 'state' and not filters.state:
+                links.append(Facet(value, count, filters.args(state=value)))
+            elif dimension == 'city' and not filters.city and value[0] is not None:
+                links.append(Facet('{}, {}'.format(*value), count,
+                                   filters.args(city=value[0], state=value[1])))
+            elif dimension == 'genre' and value not in filters.genres:
+                links.append(Facet(value, count, filters.args(genre=list(filters.genres) + [value])))
+            elif dimension == 'seeking' and not filters.seeking:
+                links.append(Facet('Yes', count, filters.args(seeking='y')))
+        facets[dimension] = links[:limit]
+    return facets
+
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+def faceted_search(model, filters, cursor=None, page_size=None):
+    # Two statements: the requested page of matches and the facet counts
+    # over all of them. With a search term the best matches come first;
+    # the rank leads the keyset so later pages continue in rank order.
+    if page_size is None:
+        page_size = current_app.config['SEARCH_RESULT_LIMIT']
+    if filters.term:
+        rank = relevance(model, filters.term)
+        columns = (rank, model.name, model.id)
+        key = lambda row: (row.relevance, row.name, row.id)
+    else:
+        rank = db.literal(0.0, db.Float)
+        columns = (model.name, model.id)
+        key = lambda row: (row.name, row.id)
+    query = db.select([model.id, model.name, model.city, model.state,
+                       rank.label('relevance')]).where(*filters.conditions(model))
+    page = paginate(
+        query,
+        columns=columns,
+        key=key,
+        cursor=cursor, page_size=page_size,
+        fetch=lambda select: fetch(select, SearchResult))
+    total, counts = facet_counts(model, filters)
+    facets = facet_links(counts, filters, current_app.config['SEARCH_FACET_LIMIT'])
+    return Results(total, page.items, facets, page)
+
+
+def search_venues(filters, cursor=None):
+    return faceted_search(Venue, filters, cursor)
+
+
+def search_artists(filters, cursor=None):
+    return faceted_search(Artist, filters, cursor)
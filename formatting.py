@@ -0,0 +1,43 @@
+from datetime import datetime
+from functools import lru_cache
+
+import dateutil.parser
+from babel import Locale
+from babel.dates import LC_TIME, UTC, parse_pattern
+
+# Template formats for the `datetime` filter.
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+# Distinct (datetime, format, locale) outputs kept. Shows cluster on a few
+# evening start times, so a listing page is mostly cache hits.
+FORMAT_CACHE_SIZE = 8192
+
+
+#----------------------------------------------------------------------------#
+# Datetime formatting.
+#----------------------------------------------------------------------------#
+
+@lru_cache(maxsize=None)
+def compiled(format, locale):
+    # Resolving the locale and parsing the pattern are the expensive parts of
+    # babel.dates.format_datetime; both only depend on (format, locale).
+    return parse_pattern(FORMATS.get(format, format)), Locale.parse(locale or LC_TIME)
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def format_cached(value, format, locale):
+    pattern, babel_locale = compiled(format, locale)
+    # Same as babel.dates.format_datetime without a tzinfo: naive values are
+    # printed as they are.
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return pattern.apply(value, babel_locale)
+
+
+def format_datetime(value, format='medium', locale=None):
+    if not isinstance(value, datetime):
+        value = dateutil.parser.parse(value)
+    return format_cached(value, format, locale)
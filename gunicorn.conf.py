@@ -0,0 +1,55 @@
+import gc
+import multiprocessing
+import os
+
+# Settings for `gunicorn -c gunicorn.conf.py wsgi:app`. Each one can be
+# overridden from the environment.
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:{}'.format(os.environ.get('PORT', 8000)))
+
+# Processes for the CPU-bound rendering, threads for the time spent
+# waiting on Postgres. Keep threads within DB_POOL_SIZE + DB_MAX_OVERFLOW
+# so no thread waits on the connection pool.
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+# The app is imported and warmed once in the master; workers fork from it
+# and share the loaded modules, compiled templates and typeahead indexes
+# copy-on-write, so a new worker is serving in milliseconds.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycling workers is cheap with a preloaded master; it bounds any slow
+# growth in a worker's memory.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+
+# Standard output by default; empty switches the access log off.
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+
+
+def when_ready(server):
+    # Runs in the master after the preload, before the first fork.
+    if not preload_app:
+        return
+    from app import warm
+    from extensions import db
+
+    app = server.app.wsgi()
+    warm(app)
+    # Warming used the pool; nothing pooled may be inherited.
+    db.dispose_engines(app)
+    # Objects that exist now are never collected, so the collector stops
+    # touching (and un-sharing) their memory pages in every worker.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Each worker opens its own connections on first use.
+    from extensions import db
+
+    db.dispose_engines(server.app.wsgi())
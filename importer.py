@@ -0,0 +1,341 @@
+import csv
+import io
+import json
+import os
+import time
+from datetime import datetime
+from itertools import islice
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.datastructures import MultiDict
+
+from extensions import db
+from cache import response_cache
+from forms import VenueForm, ArtistForm, ShowForm
+from models import Venue, Artist, Show, Genre, ImportCheckpoint, GENRE_LINKS
+from show_counts import apply_changes
+from typeahead import invalidate_indexes
+
+
+#----------------------------------------------------------------------------#
+# Row sources.
+#----------------------------------------------------------------------------#
+
+# Multi-valued CSV cells (genres) are separated with this character.
+LIST_SEPARATOR = ';'
+
+
+def read_rows(path, file_format):
+    with open(path, newline='', encoding='utf-8') as handle:
+        if file_format == 'csv':
+            for row in csv.DictReader(handle):
+                if row.get('genres') is not None:
+                    row['genres'] = [genre.strip() for genre in row['genres'].split(LIST_SEPARATOR)
+                                     if genre.strip()]
+                yield row
+        else:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def formdata(row):
+    data = MultiDict()
+    for field, value in row.items():
+        if isinstance(value, list):
+            for item in value:
+                data.add(field, str(item))
+        elif isinstance(value, bool):
+            data.add(field, 'y' if value else '')
+        elif value is not None:
+            data.add(field, str(value))
+    return data
+
+
+#----------------------------------------------------------------------------#
+# Validation.
+#----------------------------------------------------------------------------#
+
+class Kind(object):
+
+    def __init__(self, model, form, columns):
+        self.model = model
+        self.form = form
+        self.columns = columns
+
+    def validate(self, row):
+        # The same rules as the create forms; CSRF does not apply to files.
+        form = self.form(formdata=formdata(row), meta={'csrf': False})
+        if not form.validate():
+            return None, form.errors
+        values = dict((column, form.data.get(column)) for column in self.columns)
+        return self.clean(values), None
+
+    def clean(self, values):
+        return values
+
+    def check_references(self, batch):
+        return batch, []
+
+
+class VenueKind(Kind):
+
+    def clean(self, values):
+        values['seeking_talent'] = bool(values['seeking_talent'])
+        values['seeking_description'] = values['seeking_description'] or ''
+        return values
+
+
+class ArtistKind(Kind):
+
+    def validate(self, row):
+        values, errors = Kind.validate(self, row)
+        if values is not None:
+            # ArtistForm has no seeking fields yet; take them straight from the row.
+            seeking_venue = row.get('seeking_venue')
+            if isinstance(seeking_venue, str):
+                seeking_venue = seeking_venue.strip().lower() in ('y', 'yes', 'true', '1')
+            values['seeking_venue'] = bool(seeking_venue)
+            values['seeking_description'] = row.get('seeking_description') or ''
+        return values, errors
+
+
+class ShowKind(Kind):
+
+    def validate(self, row):
+        values, errors = Kind.validate(self, row)
+        if values is None:
+            return None, errors
+        try:
+            values['artist_id'] = int(values['artist_id'])
+            values['venue_id'] = int(values['venue_id'])
+        except ValueError:
+            return None, {'id': ['artist_id and venue_id must be integers']}
+        return values, None
+
+    def check_references(self, batch):
+        # One lookup per batch instead of letting a single dangling foreign
+        # key abort the whole COPY.
+        venue_ids = set(values['venue_id'] for line, values in batch)
+        artist_ids = set(values['artist_id'] for line, values in batch)
+        venues = set(row[0] for row in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids)))
+        artists = set(row[0] for row in db.session.query(Artist.id).filter(Artist.id.in_(artist_ids)))
+        valid, rejected = [], []
+        for line, values in batch:
+            if values['venue_id'] not in venues:
+                rejected.append((line, {'venue_id': ['Venue does not exist']}))
+            elif values['artist_id'] not in artists:
+                rejected.append((line, {'artist_id': ['Artist does not exist']}))
+            else:
+                valid.append((line, values))
+        return valid, rejected
+
+
+KINDS = {
+    'venues': VenueKind(Venue, VenueForm, [
+        'name', 'city', 'state', 'address', 'phone', 'genres', 'website_link',
+        'facebook_link', 'image_link', 'seeking_talent', 'seeking_description']),
+    'artists': ArtistKind(Artist, ArtistForm, [
+        'name', 'city', 'state', 'phone', 'genres', 'website_link',
+        'facebook_link', 'image_link']),
+    'shows': ShowKind(Show, ShowForm, ['artist_id', 'venue_id', 'start_time']),
+}
+
+
+#----------------------------------------------------------------------------#
+# Loading.
+#----------------------------------------------------------------------------#
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    return str(value)
+
+
+def copy_rows(table, rows):
+    # COPY FROM STDIN is the fastest way into Postgres; version and
+    # updated_at are filled in here because COPY skips Python defaults.
+    now = datetime.utcnow()
+    fields = list(rows[0].keys())
+    columns, stamps = fields, []
+    if 'version' in table.c:
+        columns, stamps = fields + ['version', 'updated_at'], [1, now.isoformat(' ')]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([copy_value(row[field]) for field in fields] + stamps)
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        'COPY "{}" ({}) FROM STDIN WITH (FORMAT csv, NULL \'\\N\')'.format(
+            table.name, ', '.join('"{}"'.format(column) for column in columns)),
+        buffer)
+
+
+def insert_rows(table, rows):
+    if db.engine.dialect.name == 'postgresql':
+        copy_rows(table, rows)
+    else:
+        db.session.execute(table.insert(), rows)
+
+
+def allocate_ids(table, count):
+    # Ids are drawn before the rows are written so their genre links can go
+    # into the same batch.
+    if db.engine.dialect.name == 'postgresql':
+        return [row[0] for row in db.session.execute(db.text(
+            "SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"),
+            {'table': table.name, 'count': count})]
+    start = db.session.execute(db.select([db.func.max(table.c.id)])).scalar() or 0
+    return list(range(start + 1, start + count + 1))
+
+
+def genre_ids(names):
+    table = Genre.__table__
+    query = db.select([table.c.name, table.c.id])
+    ids = dict(db.session.execute(query.where(table.c.name.in_(names))).fetchall())
+    missing = sorted(set(names) - set(ids))
+    if missing:
+        db.session.execute(table.insert(), [{'name': name} for name in missing])
+        ids.update(db.session.execute(query.where(table.c.name.in_(missing))).fetchall())
+    return ids
+
+
+def split_genres(model, rows):
+    # Genres are stored in the <owner>_genre link table, not on the row.
+    owner = GENRE_LINKS[model]
+    ids = genre_ids(set(genre for row in rows for genre in row['genres'] or []))
+    records, link_rows = [], []
+    for row_id, row in zip(allocate_ids(model.__table__, len(rows)), rows):
+        row = dict(row, id=row_id)
+        for genre in set(row.pop('genres') or []):
+            link_rows.append({owner.name: row_id, 'genre_id': ids[genre]})
+        records.append(row)
+    return records, owner.table, link_rows
+
+
+def load_batch(model, rows):
+    links = None
+    if 'genres' in rows[0]:
+        rows, links, link_rows = split_genres(model, rows)
+    insert_rows(model.__table__, rows)
+    if links is not None and link_rows:
+        insert_rows(links, link_rows)
+    if model is Show:
+        # COPY and executemany skip the listener that maintains the show
+        # counters, so the batch's deltas are applied in its transaction.
+        apply_changes(db.session.connection(), [
+            ((row['venue_id'], row['artist_id'], row['start_time']), 1) for row in rows])
+
+
+#----------------------------------------------------------------------------#
+# Checkpoints.
+#----------------------------------------------------------------------------#
+
+def read_checkpoint(source):
+    table = ImportCheckpoint.__table__
+    query = db.select([table.c.rows]).where(table.c.source == source)
+    return db.session.execute(query).scalar() or 0
+
+
+def write_checkpoint(source, rows):
+    # Not committed here: the caller commits it together with the batch.
+    table = ImportCheckpoint.__table__
+    updated = db.session.execute(
+        table.update().where(table.c.source == source).values(rows=rows)).rowcount
+    if not updated:
+        db.session.execute(table.insert().values(source=source, rows=rows))
+
+
+def clear_checkpoint(source):
+    table = ImportCheckpoint.__table__
+    db.session.execute(table.delete().where(table.c.source == source))
+    db.session.commit()
+
+
+#----------------------------------------------------------------------------#
+# Command.
+#----------------------------------------------------------------------------#
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']),
+              help='Input format; guessed from the file extension by default.')
+@click.option('--batch-size', default=5000, show_default=True,
+              help='Rows validated and loaded per transaction.')
+@click.option('--checkpoint', help='Checkpoint name; defaults to the absolute PATH.')
+@click.option('--restart', is_flag=True, help='Ignore an existing checkpoint.')
+@click.option('--rejects', type=click.Path(dir_okay=False),
+              help='Write rejected rows and their errors to this JSONL file.')
+@with_appcontext
+def import_command(kind, path, file_format, batch_size, checkpoint, restart, rejects):
+    """Bulk load venues, artists or shows from a CSV or JSONL file."""
+    if file_format is None:
+        file_format = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+    if checkpoint is None:
+        checkpoint = os.path.abspath(path)
+    kind = KINDS[kind]
+
+    done = 0 if restart else read_checkpoint(checkpoint)
+    if done:
+        click.echo('Resuming after row {}'.format(done))
+    rows = islice(read_rows(path, file_format), done, None)
+    rejects_file = open(rejects, 'a') if rejects else None
+
+    loaded = rejected = 0
+    started = time.time()
+    try:
+        with current_app.test_request_context():
+            while True:
+                chunk = list(islice(rows, batch_size))
+                if not chunk:
+                    break
+                batch, failures = [], []
+                for offset, row in enumerate(chunk):
+                    line = done + offset + 1
+                    values, errors = kind.validate(row)
+                    if values is None:
+                        failures.append((line, errors))
+                    else:
+                        batch.append((line, values))
+                batch, missing = kind.check_references(batch) if batch else (batch, [])
+                failures.extend(missing)
+
+                if batch:
+                    load_batch(kind.model, [values for line, values in batch])
+                write_checkpoint(checkpoint, done + len(chunk))
+                db.session.commit()
+                done += len(chunk)
+                loaded += len(batch)
+                rejected += len(failures)
+
+                if rejects_file:
+                    for line, errors in failures:
+                        rejects_file.write(json.dumps({'row': line, 'errors': errors}) + '\n')
+                elapsed = time.time() - started
+                click.echo('{} rows read, {} loaded, {} rejected ({:.0f} rows/s)'.format(
+                    done, loaded, rejected, (loaded + rejected) / elapsed if elapsed else 0))
+    finally:
+        if rejects_file:
+            rejects_file.close()
+        # Bulk loads bypass the session events that normally evict cached
+        # pages and update the typeahead indexes. A load that fails part
+        # way has still committed the batches before the failure.
+        db.session.rollback()
+        if loaded:
+            response_cache.clear()
+            if kind.model is not Show:
+                invalidate_indexes()
+
+    clear_checkpoint(checkpoint)
+
+    elapsed = time.time() - started
+    click.echo('Done: {} loaded, {} rejected in {:.1f}s ({:.0f} rows/s)'.format(
+        loaded, rejected, elapsed, loaded / elapsed if elapsed else 0))
@@ -0,0 +1,193 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from extensions import db
+
+
+# Latency buckets in seconds, the Prometheus convention.
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+#----------------------------------------------------------------------------#
+# Histograms.
+#----------------------------------------------------------------------------#
+
+class Histogram(object):
+    # Cumulative-bucket histogram keyed by route. Counters live in the worker
+    # process, so each gunicorn worker is scraped as its own target.
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.series = defaultdict(lambda: [[0] * (len(buckets) + 1), 0.0])
+
+    def observe(self, route, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series[route]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help),
+                 '# TYPE {} histogram'.format(self.name)]
+        with self.lock:
+            series = sorted((route, list(counts), total) for route, (counts, total) in self.series.items())
+        for route, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append('{}_bucket{{route="{}",le="{}"}} {}'.format(
+                    self.name, route, '+Inf' if bound == float('inf') else bound, cumulative))
+            lines.append('{}_sum{{route="{}"}} {}'.format(self.name, route, total))
+            lines.append('{}_count{{route="{}"}} {}'.format(self.name, route, cumulative))
+        return lines
+
+
+def gauge(name, help, value, kind='gauge'):
+    return ['# HELP {} {}'.format(name, help), '# TYPE {} {}'.format(name, kind),
+            '{} {}'.format(name, value)]
+
+
+#----------------------------------------------------------------------------#
+# Statement and template timing.
+#----------------------------------------------------------------------------#
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _end_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    if started and has_request_context():
+        g.sql_time = g.get('sql_time', 0.0) + time.perf_counter() - started.pop()
+    elif started:
+        started.pop()
+
+
+@event.listens_for(Engine, 'handle_error')
+def _failed_statement(context):
+    # after_cursor_execute does not fire for a statement that raised.
+    started = context.connection.info.get('metrics_started') if context.connection else None
+    if started:
+        started.pop()
+
+
+def _start_render(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+
+def _end_render(sender, template, context, **extra):
+    started = g.pop('render_started', None)
+    if started is not None:
+        g.render_time = g.get('render_time', 0.0) + time.perf_counter() - started
+
+
+#----------------------------------------------------------------------------#
+# Metrics.
+#----------------------------------------------------------------------------#
+
+class Metrics(object):
+
+    def __init__(self, app=None):
+        self.request_time = Histogram(
+            'fyyur_request_seconds', 'Time spent building the response.', TIME_BUCKETS)
+        self.sql_time = Histogram(
+            'fyyur_sql_seconds', 'Time spent executing SQL per request.', TIME_BUCKETS)
+        self.sql_statements = Histogram(
+            'fyyur_sql_statements', 'SQL statements executed per request.', COUNT_BUCKETS)
+        self.render_time = Histogram(
+            'fyyur_render_seconds', 'Time spent rendering templates per request.', TIME_BUCKETS)
+        self.checkouts = 0
+        self.connects = 0
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self.start_request)
+        app.after_request(self.end_request)
+        before_render_template.connect(_start_render, app)
+        template_rendered.connect(_end_render, app)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+        with app.app_context():
+            self.engine = db.engine
+        event.listen(self.engine, 'checkout', self.count_checkout)
+        event.listen(self.engine, 'connect', self.count_connect)
+
+    def start_request(self):
+        g.request_started = time.perf_counter()
+        g.sql_statements_before = g.get('sql_statements', 0)
+
+    def end_request(self, response):
+        started = g.get('request_started')
+        if started is None or request.endpoint == 'metrics':
+            return response
+        # Streamed responses are timed until the first byte is ready. Their
+        # templates render, and may run SQL, while the body goes out, so
+        # that work is recorded once the response is closed.
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        self.request_time.observe(route, time.perf_counter() - started)
+        if response.is_streamed:
+            state = g._get_current_object()
+            response.call_on_close(lambda: self.observe_work(route, state))
+        else:
+            self.observe_work(route, g)
+        return response
+
+    def observe_work(self, route, state):
+        self.sql_time.observe(route, state.get('sql_time', 0.0))
+        self.sql_statements.observe(route, state.get('sql_statements', 0) - state.sql_statements_before)
+        self.render_time.observe(route, state.get('render_time', 0.0))
+
+    def count_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self.lock:
+            self.checkouts += 1
+
+    def count_connect(self, dbapi_connection, connection_record):
+        with self.lock:
+            self.connects += 1
+
+    def pool_lines(self):
+        pool = self.engine.pool
+        lines = gauge('fyyur_pool_checkouts_total', 'Connections checked out of the pool.',
+                      self.checkouts, 'counter')
+        lines += gauge('fyyur_pool_connects_total', 'New database connections opened.',
+                       self.connects, 'counter')
+        # Only QueuePool reports its occupancy; SQLite's pools do not.
+        if not isinstance(pool, QueuePool):
+            return lines
+        for name, help, method in (
+                ('fyyur_pool_size', 'Configured pool size.', 'size'),
+                ('fyyur_pool_checked_out', 'Connections currently checked out.', 'checkedout'),
+                ('fyyur_pool_checked_in', 'Idle connections in the pool.', 'checkedin'),
+                ('fyyur_pool_overflow', 'Connections open beyond the pool size.', 'overflow')):
+            lines += gauge(name, help, getattr(pool, method)())
+        return lines
+
+    def render(self):
+        lines = []
+        for histogram in (self.request_time, self.sql_time, self.sql_statements, self.render_time):
+            lines += histogram.render()
+        lines += self.pool_lines()
+        return '\n'.join(lines) + '\n'
+
+    def view(self):
+        return Response(self.render(), content_type=CONTENT_TYPE)
+
+
+metrics = Metrics()
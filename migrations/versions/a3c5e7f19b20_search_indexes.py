@@ -0,0 +1,38 @@
+"""add search indexes
+
+Revision ID: a3c5e7f19b20
+Revises: 76158bd3f363
+Create Date: 2026-10-18 09:12:40.118265
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c5e7f19b20'
+down_revision = '76158bd3f363'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('venue', 'artist'):
+        op.create_index('ix_{}_name_trgm'.format(table), table, ['name'],
+                        postgresql_using='gin',
+                        postgresql_ops={'name': 'gin_trgm_ops'})
+        op.create_index('ix_{}_city_trgm'.format(table), table, ['city'],
+                        postgresql_using='gin',
+                        postgresql_ops={'city': 'gin_trgm_ops'})
+        op.create_index('ix_{}_state'.format(table), table, ['state'])
+        op.create_index('ix_{}_genres'.format(table), table, ['genres'],
+                        postgresql_using='gin')
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        op.drop_index('ix_{}_genres'.format(table), table_name=table)
+        op.drop_index('ix_{}_state'.format(table), table_name=table)
+        op.drop_index('ix_{}_city_trgm'.format(table), table_name=table)
+        op.drop_index('ix_{}_name_trgm'.format(table), table_name=table)
@@ -0,0 +1,28 @@
+"""keep import checkpoints in the database
+
+Revision ID: a7e2c9d4b318
+Revises: f1c3a8d5b264
+Create Date: 2026-10-18 23:12:08.415372
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e2c9d4b318'
+down_revision = 'f1c3a8d5b264'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('import_checkpoint',
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('rows', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('source')
+    )
+
+
+def downgrade():
+    op.drop_table('import_checkpoint')
@@ -0,0 +1,48 @@
+"""add upcoming and past show counters
+
+Revision ID: b7d3e1f05a92
+Revises: e5b9a0c3d412
+Create Date: 2026-10-18 15:42:37.218604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d3e1f05a92'
+down_revision = 'e5b9a0c3d412'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('upcoming_show_count', sa.Integer(), nullable=False,
+                                       server_default='0'))
+        op.add_column(table, sa.Column('past_show_count', sa.Integer(), nullable=False,
+                                       server_default='0'))
+    op.create_table('show_count_state',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('rolled_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # Backfill against one watermark; show times are local wall-clock time,
+    # hence localtimestamp rather than now().
+    op.execute('INSERT INTO show_count_state (id, rolled_at) VALUES (1, localtimestamp)')
+    for table, owner in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        op.execute(
+            'UPDATE {table} SET '
+            'upcoming_show_count = (SELECT count(*) FROM show WHERE show.{owner} = {table}.id '
+            'AND show.start_time > (SELECT rolled_at FROM show_count_state)), '
+            'past_show_count = (SELECT count(*) FROM show WHERE show.{owner} = {table}.id '
+            'AND show.start_time <= (SELECT rolled_at FROM show_count_state))'.format(
+                table=table, owner=owner))
+
+
+def downgrade():
+    op.drop_table('show_count_state')
+    for table in ('artist', 'venue'):
+        op.drop_column(table, 'past_show_count')
+        op.drop_column(table, 'upcoming_show_count')
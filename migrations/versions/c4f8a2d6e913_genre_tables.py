@@ -0,0 +1,73 @@
+"""move genres from arrays to genre link tables
+
+Revision ID: c4f8a2d6e913
+Revises: b7d3e1f05a92
+Create Date: 2026-10-18 16:58:12.407391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f8a2d6e913'
+down_revision = 'b7d3e1f05a92'
+branch_labels = None
+depends_on = None
+
+# forms.GENRES at the time of this migration, in form order.
+GENRES = [
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk',
+    'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop',
+    'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other',
+]
+
+
+def upgrade():
+    genre = op.create_table('genre',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=120), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    op.bulk_insert(genre, [{'name': name} for name in GENRES])
+
+    for table in ('venue', 'artist'):
+        owner = '{}_id'.format(table)
+        op.create_table('{}_genre'.format(table),
+            sa.Column(owner, sa.Integer(), nullable=False),
+            sa.Column('genre_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint([owner], ['{}.id'.format(table)], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['genre_id'], ['genre.id']),
+            sa.PrimaryKeyConstraint(owner, 'genre_id')
+        )
+
+        # Free-text genres that never came from the form keep their rows.
+        op.execute(
+            'INSERT INTO genre (name) SELECT DISTINCT unnest(genres) FROM {table} '
+            'ON CONFLICT (name) DO NOTHING'.format(table=table))
+        op.execute(
+            'INSERT INTO {table}_genre ({owner}, genre_id) '
+            'SELECT DISTINCT {table}.id, genre.id FROM {table} '
+            'CROSS JOIN LATERAL unnest({table}.genres) AS tagged(name) '
+            'JOIN genre ON genre.name = tagged.name'.format(table=table, owner=owner))
+        op.create_index('ix_{}_genre_genre_id_{}'.format(table, owner), '{}_genre'.format(table),
+                        ['genre_id', owner])
+
+        op.drop_index('ix_{}_genres'.format(table), table_name=table)
+        op.drop_column(table, 'genres')
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        owner = '{}_id'.format(table)
+        op.add_column(table, sa.Column('genres', postgresql.ARRAY(sa.String()), nullable=True))
+        op.execute(
+            'UPDATE {table} SET genres = (SELECT array_agg(genre.name ORDER BY genre.id) '
+            'FROM {table}_genre JOIN genre ON genre.id = {table}_genre.genre_id '
+            'WHERE {table}_genre.{owner} = {table}.id)'.format(table=table, owner=owner))
+        op.create_index('ix_{}_genres'.format(table), table, ['genres'],
+                        postgresql_using='gin')
+        op.drop_table('{}_genre'.format(table))
+    op.drop_table('genre')
@@ -0,0 +1,40 @@
+"""add show and listing indexes
+
+Revision ID: c81f2d4b6e07
+Revises: a3c5e7f19b20
+Create Date: 2026-10-18 10:03:27.540912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81f2d4b6e07'
+down_revision = 'a3c5e7f19b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Owner + start_time range scans for the detail pages and upcoming show
+    # counts, with the remaining columns appended so they are covering.
+    op.create_index('ix_show_venue_id_start_time', 'show',
+                    ['venue_id', 'start_time', 'artist_id', 'id'])
+    op.create_index('ix_show_artist_id_start_time', 'show',
+                    ['artist_id', 'start_time', 'venue_id', 'id'])
+    # A b-tree rather than BRIN: the /shows listing seeks and reads in
+    # (start_time, id) order, which BRIN cannot provide.
+    op.create_index('ix_show_start_time_id', 'show', ['start_time', 'id'])
+    # Area ordering of /venues; also covers the state lookups that the
+    # single-column search index served.
+    op.create_index('ix_venue_state_city_id', 'venue', ['state', 'city', 'id'])
+    op.drop_index('ix_venue_state', table_name='venue')
+
+
+def downgrade():
+    op.create_index('ix_venue_state', 'venue', ['state'])
+    op.drop_index('ix_venue_state_city_id', table_name='venue')
+    op.drop_index('ix_show_start_time_id', table_name='show')
+    op.drop_index('ix_show_artist_id_start_time', table_name='show')
+    op.drop_index('ix_show_venue_id_start_time', table_name='show')
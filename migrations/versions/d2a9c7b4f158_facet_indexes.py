@@ -0,0 +1,35 @@
+"""add indexes for faceted search
+
+Revision ID: d2a9c7b4f158
+Revises: c4f8a2d6e913
+Create Date: 2026-10-18 18:14:51.630257
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a9c7b4f158'
+down_revision = 'c4f8a2d6e913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # State and city facets on artists; replaces the state-only index the
+    # same way the venue one was.
+    op.create_index('ix_artist_state_city_id', 'artist', ['state', 'city', 'id'])
+    op.drop_index('ix_artist_state', table_name='artist')
+    # Partial indexes for the seeking filters, in search result order.
+    op.create_index('ix_venue_seeking_talent', 'venue', ['name', 'id'],
+                    postgresql_where=sa.text('seeking_talent'))
+    op.create_index('ix_artist_seeking_venue', 'artist', ['name', 'id'],
+                    postgresql_where=sa.text('seeking_venue'))
+
+
+def downgrade():
+    op.drop_index('ix_artist_seeking_venue', table_name='artist')
+    op.drop_index('ix_venue_seeking_talent', table_name='venue')
+    op.create_index('ix_artist_state', 'artist', ['state'])
+    op.drop_index('ix_artist_state_city_id', table_name='artist')
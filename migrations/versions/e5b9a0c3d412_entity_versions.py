@@ -0,0 +1,30 @@
+"""add version and updated_at columns
+
+Revision ID: e5b9a0c3d412
+Revises: c81f2d4b6e07
+Create Date: 2026-10-18 11:21:05.804716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b9a0c3d412'
+down_revision = 'c81f2d4b6e07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venue', 'artist', 'show'):
+        op.add_column(table, sa.Column('version', sa.Integer(), nullable=False,
+                                       server_default='1'))
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                       server_default=sa.text("(now() at time zone 'utc')")))
+
+
+def downgrade():
+    for table in ('show', 'artist', 'venue'):
+        op.drop_column(table, 'updated_at')
+        op.drop_column(table, 'version')
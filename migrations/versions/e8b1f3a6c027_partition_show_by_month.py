@@ -0,0 +1,115 @@
+"""range-partition show by month of start_time
+
+Revision ID: e8b1f3a6c027
+Revises: d2a9c7b4f158
+Create Date: 2026-10-18 19:36:08.915462
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b1f3a6c027'
+down_revision = 'd2a9c7b4f158'
+branch_labels = None
+depends_on = None
+
+# Months prepared beyond the current one; `flask show-partitions create`
+# keeps extending this from cron.
+AHEAD = 12
+
+COLUMNS = 'id, artist_id, venue_id, start_time, version, updated_at'
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_indexes():
+    op.create_index('ix_show_venue_id_start_time', 'show',
+                    ['venue_id', 'start_time', 'artist_id', 'id'])
+    op.create_index('ix_show_artist_id_start_time', 'show',
+                    ['artist_id', 'start_time', 'venue_id', 'id'])
+    op.create_index('ix_show_start_time_id', 'show', ['start_time', 'id'])
+
+
+def drop_indexes(table):
+    op.drop_index('ix_show_start_time_id', table_name=table)
+    op.drop_index('ix_show_artist_id_start_time', table_name=table)
+    op.drop_index('ix_show_venue_id_start_time', table_name=table)
+
+
+def upgrade():
+    # The copy rewrites the whole table; the server-side limit is meant for
+    # requests.
+    op.execute('SET LOCAL statement_timeout = 0')
+    bind = op.get_bind()
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence('show', 'id')")).scalar()
+    first = bind.execute(sa.text('SELECT min(start_time) FROM show')).scalar()
+
+    # The old table keeps its data until the copy is done; its index names
+    # are freed for the partitioned table.
+    drop_indexes('show')
+    op.execute('ALTER TABLE show RENAME TO show_unpartitioned')
+    op.execute('ALTER TABLE show_unpartitioned RENAME CONSTRAINT show_pkey TO show_unpartitioned_pkey')
+
+    # A partitioned table's unique keys must include the partition key.
+    op.execute(
+        "CREATE TABLE show ("
+        "id integer NOT NULL DEFAULT nextval('{}'::regclass), "
+        "artist_id integer NOT NULL REFERENCES artist (id), "
+        "venue_id integer NOT NULL REFERENCES venue (id), "
+        "start_time timestamp without time zone NOT NULL, "
+        "version integer NOT NULL DEFAULT 1, "
+        "updated_at timestamp without time zone NOT NULL DEFAULT (now() at time zone 'utc'), "
+        "PRIMARY KEY (id, start_time)"
+        ") PARTITION BY RANGE (start_time)".format(sequence))
+    op.execute('CREATE TABLE show_default PARTITION OF show DEFAULT')
+
+    current = date.today().replace(day=1)
+    month = min(first.date().replace(day=1), current) if first is not None else current
+    while month <= add_months(current, AHEAD):
+        op.execute(
+            "CREATE TABLE show_p{:%Y%m} PARTITION OF show "
+            "FOR VALUES FROM ('{:%Y-%m-%d}') TO ('{:%Y-%m-%d}')".format(
+                month, month, add_months(month, 1)))
+        month = add_months(month, 1)
+    create_indexes()
+
+    op.execute('INSERT INTO show ({0}) SELECT {0} FROM show_unpartitioned'.format(COLUMNS))
+    op.execute('ALTER SEQUENCE {} OWNED BY show.id'.format(sequence))
+    op.execute('DROP TABLE show_unpartitioned')
+
+    # Detached partitions past the retention window are attached here.
+    op.execute('CREATE TABLE show_archive (LIKE show INCLUDING DEFAULTS) '
+               'PARTITION BY RANGE (start_time)')
+
+
+def downgrade():
+    op.execute('SET LOCAL statement_timeout = 0')
+    bind = op.get_bind()
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence('show', 'id')")).scalar()
+
+    drop_indexes('show')
+    op.execute('ALTER TABLE show RENAME TO show_partitioned')
+    op.execute('ALTER TABLE show_partitioned RENAME CONSTRAINT show_pkey TO show_partitioned_pkey')
+    op.execute(
+        "CREATE TABLE show ("
+        "id integer NOT NULL DEFAULT nextval('{}'::regclass) PRIMARY KEY, "
+        "artist_id integer NOT NULL REFERENCES artist (id), "
+        "venue_id integer NOT NULL REFERENCES venue (id), "
+        "start_time timestamp without time zone NOT NULL, "
+        "version integer NOT NULL DEFAULT 1, "
+        "updated_at timestamp without time zone NOT NULL DEFAULT (now() at time zone 'utc')"
+        ")".format(sequence))
+    # Archived shows come back too; nothing is lost on the way down.
+    op.execute('INSERT INTO show ({0}) SELECT {0} FROM show_partitioned '
+               'UNION ALL SELECT {0} FROM show_archive'.format(COLUMNS))
+    create_indexes()
+    op.execute('ALTER SEQUENCE {} OWNED BY show.id'.format(sequence))
+    op.execute('DROP TABLE show_partitioned')
+    op.execute('DROP TABLE show_archive')
@@ -0,0 +1,40 @@
+"""make the keyset order columns not null
+
+Revision ID: f1c3a8d5b264
+Revises: e8b1f3a6c027
+Create Date: 2026-10-18 21:04:37.216530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c3a8d5b264'
+down_revision = 'e8b1f3a6c027'
+branch_labels = None
+depends_on = None
+
+# Columns the listings and search results are paged on. A row-value
+# comparison against a NULL is NULL, so such rows were skipped by every
+# page after the first.
+COLUMNS = [
+    ('venue', 'name', sa.String()),
+    ('venue', 'city', sa.String(120)),
+    ('venue', 'state', sa.String(120)),
+    ('artist', 'name', sa.String()),
+]
+
+
+def upgrade():
+    # The backfill rewrites whole tables; the server-side limit is meant
+    # for requests.
+    op.execute('SET LOCAL statement_timeout = 0')
+    for table, column, type_ in COLUMNS:
+        op.execute("UPDATE {0} SET {1} = '' WHERE {1} IS NULL".format(table, column))
+        op.alter_column(table, column, existing_type=type_, nullable=False, server_default='')
+
+
+def downgrade():
+    for table, column, type_ in COLUMNS:
+        op.alter_column(table, column, existing_type=type_, nullable=True, server_default=None)
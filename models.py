@@ -1,22 +1,102 @@
-from app import db
+from extensions import db
 from datetime import *
+from sqlalchemy import event
+from sqlalchemy.ext.associationproxy import association_proxy
+
+from forms import GENRES
+
+
+def search_indexes(table):
+    # Trigram GIN indexes on name and city. Mirrors the search indexes
+    # migration; other dialects get plain indexes.
+    return (
+        db.Index('ix_{}_name_trgm'.format(table), 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_{}_city_trgm'.format(table), 'city', postgresql_using='gin',
+                 postgresql_ops={'city': 'gin_trgm_ops'}),
+    )
+
+
+def genre_links(owner):
+    # <owner>_genre link table. The primary key loads one owner's genres;
+    # the (genre_id, <owner>_id) index serves browsing a genre and the
+    # per-genre counts without touching the owner table.
+    column = '{}_id'.format(owner)
+    return db.Table(
+        '{}_genre'.format(owner),
+        db.Column(column, db.Integer, db.ForeignKey('{}.id'.format(owner), ondelete='CASCADE'),
+                  primary_key=True),
+        db.Column('genre_id', db.Integer, db.ForeignKey('genre.id'), primary_key=True),
+        db.Index('ix_{}_genre_genre_id_{}'.format(owner, column), 'genre_id', column),
+    )
+
+
+class Genre(db.Model):
+    # Seeded from forms.GENRES by the genre migration; a name outside that
+    # list is added the first time something is tagged with it.
+    __tablename__ = 'genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    def __init__(self, name):
+        self.name = name
+
+    @classmethod
+    def named(cls, name):
+        with db.session.no_autoflush:
+            genre = cls.query.filter_by(name=name).one_or_none()
+        return genre if genre is not None else cls(name)
+
+
+@event.listens_for(Genre.__table__, 'after_create')
+def _seed_genres(table, connection, **kw):
+    # Databases built with create_all get the rows the migration inserts.
+    connection.execute(table.insert(), [{'name': value} for value, label in GENRES])
+
+
+venue_genres = genre_links('venue')
+artist_genres = genre_links('artist')
+
 
 class Venue(db.Model):
     __tablename__ = 'venue'
+    __table_args__ = search_indexes('venue') + (
+        # Serves state lookups in search, the state and city facets and the
+        # area ordering of /venues.
+        db.Index('ix_venue_state_city_id', 'state', 'city', 'id'),
+        # The seeking facet picks out a minority of rows, already in the
+        # (name, id) order of the search results.
+        db.Index('ix_venue_seeking_talent', 'name', 'id',
+                 postgresql_where=db.text('seeking_talent')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
+    # name, city and state are keyset pagination columns; a NULL would drop
+    # the row from every page after the first.
+    name = db.Column(db.String, nullable=False, server_default='')
+    city = db.Column(db.String(120), nullable=False, server_default='')
+    state = db.Column(db.String(120), nullable=False, server_default='')
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
     website_link = db.Column(db.String(500))
-    genres = db.Column(db.ARRAY(db.String))
+    genre_list = db.relationship('Genre', secondary=venue_genres, order_by='Genre.id')
+    genres = association_proxy('genre_list', 'name', creator=Genre.named)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(500))
     seeking_talent = db.Column(db.Boolean, default=True)
     seeking_description = db.Column(db.String(500))
     shows = db.relationship('Show', backref="Venue", lazy="dynamic")
+    # Kept current by show_counts.py as of ShowCountState.rolled_at.
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Every UPDATE bumps version; together with updated_at it drives the
+    # ETag/Last-Modified validators of the pages showing this row.
+    __mapper_args__ = {'version_id_col': version}
 
     def __init__(self, name, city, state, address, phone, website_link, genres, image_link, facebook_link, seeking_talent=False, seeking_description=""):
         self.name = name
@@ -63,7 +143,7 @@ class Venue(db.Model):
         return {
             'id': self.id,
             'name': self.name,
-            'genres': self.genres,
+            'genres': list(self.genres),
             'address': self.address,
             'city': self.city,
             'state': self.state,
@@ -84,10 +164,17 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'artist'
+    __table_args__ = search_indexes('artist') + (
+        db.Index('ix_artist_state_city_id', 'state', 'city', 'id'),
+        db.Index('ix_artist_seeking_venue', 'name', 'id',
+                 postgresql_where=db.text('seeking_venue')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    genres = db.Column(db.ARRAY(db.String))
+    # Search results are paged on (name, id); see Venue.
+    name = db.Column(db.String, nullable=False, server_default='')
+    genre_list = db.relationship('Genre', secondary=artist_genres, order_by='Genre.id')
+    genres = association_proxy('genre_list', 'name', creator=Genre.named)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
@@ -97,6 +184,16 @@ class Artist(db.Model):
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(500))
     shows = db.relationship('Show', backref='Artist', lazy="dynamic")
+    # Kept current by show_counts.py as of ShowCountState.rolled_at.
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Every UPDATE bumps version; together with updated_at it drives the
+    # ETag/Last-Modified validators of the pages showing this row.
+    __mapper_args__ = {'version_id_col': version}
 
     def __init__(self, name, genres, city, state, phone, website_link, image_link, facebook_link, seeking_venue=False, seeking_description=""):
         self.name = name
@@ -133,7 +230,7 @@ class Artist(db.Model):
         return {
             'id': self.id,
             'name': self.name,
-            'genres': self.genres,
+            'genres': list(self.genres),
             'city': self.city,
             'state': self.state,
             'phone': self.phone,
@@ -145,15 +242,56 @@ class Artist(db.Model):
         }
 
 
+def _touch(target, value, initiator):
+    # Genre links live in their own table, so changing them alone would
+    # not UPDATE the owner row; bump it so version and updated_at still
+    # move for the page validators.
+    target.updated_at = datetime.utcnow()
+
+
+for _owner in (Venue, Artist):
+    event.listen(_owner.genre_list, 'append', _touch)
+    event.listen(_owner.genre_list, 'remove', _touch)
+
+# The owner column of each model's genre link table.
+GENRE_LINKS = {Venue: venue_genres.c.venue_id, Artist: artist_genres.c.artist_id}
+
+
 class Show(db.Model):
 
+    # On Postgres the table is range-partitioned by month of start_time
+    # (see partitions.py), which makes its primary key (id, start_time);
+    # the mapper still identifies shows by id alone. Nothing in the database
+    # keeps id unique across partitions: that rests on every insert, the
+    # importer's included, drawing id from the table's sequence, so never
+    # write an explicit id.
     __tablename__ = 'show'
+    __table_args__ = (
+        # Venue and artist pages and the upcoming show counts filter on the
+        # owner plus a start_time range; the trailing columns make them
+        # covering so those reads never touch the heap.
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time', 'artist_id', 'id'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time', 'venue_id', 'id'),
+        # Keyset order of the global /shows listing.
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey(
-        'artist.id'), nullable=False)
-    venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False)
+    # active_history loads the previous value before an overwrite, so the
+    # show counters can take the show off its old venue, artist and bucket.
+    artist_id = db.column_property(db.Column(db.Integer, db.ForeignKey(
+        'artist.id'), nullable=False), active_history=True)
+    venue_id = db.column_property(db.Column(
+        db.Integer, db.ForeignKey('venue.id'), nullable=False), active_history=True)
+    start_time = db.column_property(
+        db.Column(db.DateTime, nullable=False), active_history=True)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Every UPDATE bumps version; together with updated_at it drives the
+    # ETag/Last-Modified validators of the pages showing this row.
+    __mapper_args__ = {'version_id_col': version}
 
     def insert(self):
         db.session.add(self)
@@ -163,6 +301,9 @@ class Show(db.Model):
         db.session.commit()
 
     def delete(self):
+        # The venue and artist pages lose a row; touch both so their
+        # Last-Modified moves forward.
+        self.Venue.updated_at = self.Artist.updated_at = datetime.utcnow()
         db.session.delete(self)
         db.session.commit()
 
@@ -173,7 +314,7 @@ class Show(db.Model):
             'artist_id': self.artist_id,
             'artist_name': self.Artist.name,
             'artist_image_link': self.Artist.image_link,
-            'start_time': datetime.strftime(self.start_time, '%Y-%m-%d %H:%M:%S')
+            'start_time': self.start_time
         }
 
     def artist_details(self):
@@ -181,7 +322,7 @@ class Show(db.Model):
             'artist_id': self.artist_id,
             'artist_name': self.Artist.name,
             'artist_image_link': self.Artist.image_link,
-            'start_time': datetime.strftime(self.start_time, '%Y-%m-%d %H:%M:%S')
+            'start_time': self.start_time
         }
 
     def venue_details(self):
@@ -189,5 +330,24 @@ class Show(db.Model):
             'venue_id': self.venue_id,
             'venue_name': self.Venue.name,
             'venue_image_link': self.Venue.image_link,
-            'start_time': datetime.strftime(self.start_time, '%Y-%m-%d %H:%M:%S')
-        }
\ No newline at end of file
+            'start_time': self.start_time
+        }
+
+
+class ShowCountState(db.Model):
+    # Single row: venue and artist show counts treat shows starting after
+    # rolled_at as upcoming until the roll-forward job moves them to past.
+    __tablename__ = 'show_count_state'
+
+    id = db.Column(db.Integer, primary_key=True)
+    rolled_at = db.Column(db.DateTime, nullable=False)
+
+
+class ImportCheckpoint(db.Model):
+    # Rows of an import file already loaded, keyed by the file. Written in
+    # the transaction of the batch it counts, so a resumed import neither
+    # repeats nor skips a batch.
+    __tablename__ = 'import_checkpoint'
+
+    source = db.Column(db.String, primary_key=True)
+    rows = db.Column(db.Integer, nullable=False)
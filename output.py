@@ -0,0 +1,224 @@
+import base64
+import binascii
+import gzip
+import os
+import zlib
+
+from flask import (Response, before_render_template, current_app, g, render_template, request,
+                   stream_with_context, template_rendered)
+from flask_wtf.csrf import CSRFProtect, generate_csrf
+
+# Optional: without the Brotli package responses are only gzipped.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = frozenset([
+    'text/html', 'text/plain', 'text/css', 'text/javascript', 'application/javascript',
+    'application/json', 'application/x-ndjson',
+])
+
+
+#----------------------------------------------------------------------------#
+# Streaming.
+#----------------------------------------------------------------------------#
+
+def buffered(pieces, size):
+    # Join the pieces into chunks of roughly `size` bytes so a stream is
+    # not written to the socket one row or template fragment at a time.
+    buffer, length = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_page(template_name, **context):
+    # render_template, but the page goes out as it renders: the head and
+    # its asset links reach the browser before the last row is formatted.
+    app = current_app._get_current_object()
+    if not app.config['STREAM_TEMPLATES']:
+        return render_template(template_name, **context)
+
+    # The layout's search forms embed the CSRF token. It has to be in the
+    # session now, as the session cookie goes out with the headers, and
+    # masked now so the response cache knows which value the page carries.
+    masked_csrf_token()
+    template = app.jinja_env.get_or_select_template(template_name)
+    app.update_template_context(context)
+
+    def generate():
+        before_render_template.send(app, template=template, context=context)
+        for chunk in buffered(template.generate(context), app.config['STREAM_CHUNK_SIZE']):
+            yield chunk
+        template_rendered.send(app, template=template, context=context)
+
+    return Response(stream_with_context(generate()), mimetype='text/html')
+
+
+#----------------------------------------------------------------------------#
+# Token masking.
+#----------------------------------------------------------------------------#
+
+# BREACH: a secret repeated verbatim in every compressed response can be
+# recovered from the response sizes when the page also reflects text the
+# client chose (a search term, a form sent back with its errors). Pages
+# carry the CSRF token XORed with a fresh random pad instead, pad first, so
+# no two responses share its bytes and compression stays safe.
+
+def mask_token(token):
+    data = token.encode('ascii')
+    pad = os.urandom(len(data))
+    masked = bytes(a ^ b for a, b in zip(pad, data))
+    return base64.urlsafe_b64encode(pad + masked).decode('ascii')
+
+
+def unmask_token(value):
+    try:
+        data = base64.urlsafe_b64decode(value.encode('ascii'))
+    except (binascii.Error, UnicodeEncodeError):
+        return None
+    if not data or len(data) % 2:
+        return None
+    pad, masked = data[:len(data) // 2], data[len(data) // 2:]
+    return bytes(a ^ b for a, b in zip(pad, masked)).decode('latin-1')
+
+
+def masked_csrf_token():
+    # One masked value per response, so a cached page can swap it in whole.
+    if 'masked_csrf_token' not in g:
+        g.masked_csrf_token = mask_token(generate_csrf())
+    return g.masked_csrf_token
+
+
+class MaskedCSRFProtect(CSRFProtect):
+    # CSRFProtect, with templates given the masked token and submissions
+    # unmasked before Flask-WTF checks them. A signed token sent as it is
+    # (it contains dots, which the masked form never does) is checked as
+    # it is, so pages rendered before masking still post.
+
+    def init_app(self, app):
+        CSRFProtect.init_app(self, app)
+        app.jinja_env.globals['csrf_token'] = masked_csrf_token
+        app.context_processor(lambda: {'csrf_token': masked_csrf_token})
+
+    def _get_csrf_token(self):
+        value = CSRFProtect._get_csrf_token(self)
+        if value and '.' not in value:
+            return unmask_token(value)
+        return value
+
+
+#----------------------------------------------------------------------------#
+# Compression.
+#----------------------------------------------------------------------------#
+
+class GzipStream(object):
+
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def write(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def close(self):
+        return self.compressor.flush()
+
+
+class BrotliStream(object):
+
+    def __init__(self, quality):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def write(self, data):
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def close(self):
+        return self.compressor.finish()
+
+
+class Compression(object):
+    # Negotiated gzip or brotli for dynamic responses. Whole bodies below
+    # COMPRESS_MIN_SIZE are sent as they are; streamed bodies have no size
+    # up front and are compressed chunk by chunk, each chunk flushed so the
+    # browser can render what has arrived.
+
+    def __init__(self, app=None):
+        self.min_size = 0
+        self.gzip_level = 6
+        self.brotli_quality = 4
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.gzip_level = app.config['COMPRESS_GZIP_LEVEL']
+        self.brotli_quality = app.config['COMPRESS_BROTLI_QUALITY']
+        app.after_request(self.compress)
+
+    def negotiate(self):
+        if brotli is not None and request.accept_encodings['br']:
+            return 'br'
+        if request.accept_encodings['gzip']:
+            return 'gzip'
+        return None
+
+    def stream(self, encoding):
+        if encoding == 'br':
+            return BrotliStream(self.brotli_quality)
+        return GzipStream(self.gzip_level)
+
+    def compressed(self, chunks, encoding):
+        stream = self.stream(encoding)
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                data = stream.write(chunk)
+                if data:
+                    yield data
+            yield stream.close()
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def compress(self, response):
+        # Files and assets that carry their own encoding are left alone.
+        # Pages with a CSRF token are safe to compress: it is masked per
+        # response (see mask_token).
+        if (response.status_code != 200 or response.direct_passthrough
+                or response.mimetype not in COMPRESSIBLE
+                or 'Content-Encoding' in response.headers):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self.compressed(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            if encoding == 'br':
+                response.set_data(brotli.compress(data, quality=self.brotli_quality))
+            else:
+                response.set_data(gzip.compress(data, self.gzip_level))
+        response.headers['Content-Encoding'] = encoding
+
+        # The compressed bytes differ from the identity ones, so a strong
+        # validator no longer holds; a weak one still revalidates.
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+compression = Compression()
@@ -0,0 +1,113 @@
+import base64
+import binascii
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.sql import Select
+
+from extensions import db
+
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+Page = namedtuple('Page', ['items', 'next_cursor', 'prev_cursor'])
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def _check_value(value, column):
+    # The value a cursor carries for `column`, or ValueError when it cannot
+    # be one: an edited cursor must not reach the database as a type error.
+    try:
+        expected = column.type.python_type
+    except NotImplementedError:
+        return value
+    if value is None or isinstance(value, bool):
+        raise ValueError(value)
+    if expected is float and isinstance(value, int):
+        value = float(value)
+    if not isinstance(value, expected):
+        raise ValueError(value)
+    if isinstance(value, int) and not -2 ** 63 <= value < 2 ** 63:
+        raise ValueError(value)
+    if isinstance(value, str) and '\x00' in value:
+        raise ValueError(value)
+    return value
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps([direction, [_encode_value(value) for value in values]])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, columns):
+    # A missing or malformed cursor simply means the first page, as does one
+    # whose values do not fit the ordering columns one for one.
+    if not cursor:
+        return None, 'next'
+    try:
+        direction, values = json.loads(
+            base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        if direction not in ('next', 'prev') or len(values) != len(columns):
+            return None, 'next'
+        return [_check_value(_decode_value(value), column)
+                for value, column in zip(values, columns)], direction
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        return None, 'next'
+
+
+def seek(query, columns, cursor=None, page_size=None):
+    # Seek past the cursor's sort key with a row-value comparison instead of
+    # OFFSET, so every page costs the same no matter how deep it is. One
+    # extra row is fetched to tell whether another page follows.
+    if page_size is None:
+        page_size = current_app.config['PAGE_SIZE']
+    values, direction = decode_cursor(cursor, columns)
+
+    if values is not None:
+        position = db.tuple_(*columns)
+        boundary = db.tuple_(*[db.literal(value) for value in values])
+        condition = position > boundary if direction == 'next' else position < boundary
+        # Works on ORM queries and on Core selects alike.
+        query = query.where(condition) if isinstance(query, Select) else query.filter(condition)
+
+    if direction == 'next':
+        query = query.order_by(None).order_by(*columns)
+    else:
+        query = query.order_by(None).order_by(*[column.desc() for column in columns])
+
+    return query.limit(page_size + 1), values, direction, page_size
+
+
+def paginate(query, columns, key, cursor=None, page_size=None, fetch=None):
+    # `columns` are the ordering columns and `key` reads them back off a row.
+    # `fetch` runs the limited query; ORM queries default to Query.all().
+    query, values, direction, page_size = seek(query, columns, cursor, page_size)
+
+    rows = fetch(query) if fetch is not None else query.all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == 'prev':
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or direction == 'prev':
+            next_cursor = encode_cursor(key(rows[-1]), 'next')
+        if values is not None and (has_more or direction == 'next'):
+            prev_cursor = encode_cursor(key(rows[0]), 'prev')
+    return Page(rows, next_cursor, prev_cursor)
@@ -0,0 +1,150 @@
+from datetime import date, datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import text
+
+from extensions import db
+from cache import response_cache
+
+# On Postgres `show` is range-partitioned by month of start_time: one
+# show_pYYYYMM table per month plus show_default for anything outside the
+# prepared months. Partitions past the retention window are moved under
+# show_archive, which has the same columns and is never read by the app.
+
+
+#----------------------------------------------------------------------------#
+# Months.
+#----------------------------------------------------------------------------#
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return 'show_p{:%Y%m}'.format(month)
+
+
+def bounds(month):
+    return "FROM ('{:%Y-%m-%d}') TO ('{:%Y-%m-%d}')".format(month, add_months(month, 1))
+
+
+def attached_months(connection, parent):
+    # Months of the monthly partitions attached to `parent`, oldest first.
+    names = connection.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :parent AND child.relname ~ '^show_p[0-9]{6}$'"),
+        {'parent': parent}).scalars()
+    return sorted(datetime.strptime(name[len('show_p'):], '%Y%m').date() for name in names)
+
+
+#----------------------------------------------------------------------------#
+# Partition management.
+#----------------------------------------------------------------------------#
+
+def create_partition(connection, month):
+    # Shows for the month may already have landed in show_default. They
+    # are moved into the new table first: attaching checks that the
+    # default partition holds nothing in the new range.
+    name = partition_name(month)
+    window = {'lower': month, 'upper': add_months(month, 1)}
+    connection.execute(text(
+        'CREATE TABLE {} (LIKE show INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'.format(name)))
+    connection.execute(text(
+        'INSERT INTO {} SELECT * FROM show_default '
+        'WHERE start_time >= :lower AND start_time < :upper'.format(name)), window)
+    connection.execute(text(
+        'DELETE FROM show_default WHERE start_time >= :lower AND start_time < :upper'), window)
+    connection.execute(text('ALTER TABLE show ATTACH PARTITION {} FOR VALUES {}'.format(
+        name, bounds(month))))
+
+
+def ensure_partitions(connection, ahead, today=None):
+    # This month and the next `ahead` months; returns the ones created.
+    current = month_start(today or date.today())
+    existing = set(attached_months(connection, 'show'))
+    created = []
+    for offset in range(ahead + 1):
+        month = add_months(current, offset)
+        if month not in existing:
+            create_partition(connection, month)
+            created.append(month)
+    return created
+
+
+def archive_partition(connection, month):
+    # The shows leave every page, so the past counters drop them too.
+    name = partition_name(month)
+    for table, owner in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        connection.execute(text(
+            'UPDATE {table} SET past_show_count = {table}.past_show_count - archived.shows '
+            'FROM (SELECT {owner} AS id, count(*) AS shows FROM {name} GROUP BY {owner}) AS archived '
+            'WHERE {table}.id = archived.id'.format(table=table, owner=owner, name=name)))
+    connection.execute(text('ALTER TABLE show DETACH PARTITION {}'.format(name)))
+    connection.execute(text('ALTER TABLE show_archive ATTACH PARTITION {} FOR VALUES {}'.format(
+        name, bounds(month))))
+
+
+def archive_partitions(connection, retained, today=None):
+    # Every month that ended more than `retained` months ago; returns them.
+    cutoff = add_months(month_start(today or date.today()), -retained)
+    archived = []
+    for month in attached_months(connection, 'show'):
+        if add_months(month, 1) <= cutoff:
+            archive_partition(connection, month)
+            archived.append(month)
+    return archived
+
+
+#----------------------------------------------------------------------------#
+# Command.
+#----------------------------------------------------------------------------#
+
+def partition_connection():
+    if db.engine.dialect.name != 'postgresql':
+        raise click.ClickException('The show table is only partitioned on Postgres.')
+    return db.session.connection()
+
+
+@click.group('show-partitions', cls=AppGroup)
+def show_partitions():
+    """Manage the monthly partitions of the show table."""
+
+
+@show_partitions.command('create')
+@click.option('--ahead', type=click.IntRange(min=0),
+              help='Months to prepare beyond this one; defaults to SHOW_PARTITIONS_AHEAD.')
+def create_command(ahead):
+    """Create this month's partition and the upcoming ones; run monthly."""
+    if ahead is None:
+        ahead = current_app.config['SHOW_PARTITIONS_AHEAD']
+    created = ensure_partitions(partition_connection(), ahead)
+    db.session.commit()
+    for month in created:
+        click.echo('Created {}'.format(partition_name(month)))
+    click.echo('{} partition(s) created'.format(len(created)))
+
+
+@show_partitions.command('archive')
+@click.option('--retain', type=click.IntRange(min=1),
+              help='Past months to keep attached; defaults to SHOW_PARTITIONS_RETAINED.')
+def archive_command(retain):
+    """Move partitions older than the retention window under show_archive."""
+    if retain is None:
+        retain = current_app.config['SHOW_PARTITIONS_RETAINED']
+    archived = archive_partitions(partition_connection(), retain)
+    db.session.commit()
+    if archived:
+        # Detail pages lose their oldest shows.
+        response_cache.clear()
+    for month in archived:
+        click.echo('Archived {}'.format(partition_name(month)))
+    click.echo('{} partition(s) archived'.format(len(archived)))
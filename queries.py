@@ -0,0 +1,314 @@
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import abort, current_app, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+from models import Venue, Artist, Show, GENRE_LINKS
+from pagination import paginate, seek
+from read_models import (Summary, VenueSummary, ShowSummary, PlaceSummary, GenreCount,
+                         artist_summaries, show_summaries, genre_members, genre_counts, fetch)
+
+
+#----------------------------------------------------------------------------#
+# Statement budgets
+#----------------------------------------------------------------------------#
+
+class StatementBudgetExceeded(RuntimeError):
+    pass
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    # Only the page's own queries count. Session settings such as
+    # statement_timeout are not queries, and work the request merely
+    # happens to trigger (a replica health check, the first build of an
+    # in-process index) runs with the `infrastructure` execution option.
+    if not has_request_context() or statement.startswith('SET '):
+        return
+    if context is not None and context.execution_options.get('infrastructure'):
+        return
+    g.sql_statements = g.get('sql_statements', 0) + 1
+
+
+def statement_budget(limit):
+    # Fails the request when a view issues more than `limit` SQL statements,
+    # which is how N+1 regressions surface. Only enforced when
+    # ENFORCE_STATEMENT_BUDGETS is on (by default, in debug mode).
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            before = g.get('sql_statements', 0)
+            response = view(*args, **kwargs)
+            issued = g.get('sql_statements', 0) - before
+            if current_app.config['ENFORCE_STATEMENT_BUDGETS'] and issued > limit:
+                raise StatementBudgetExceeded('{} issued {} SQL statements, budget is {}'.format(
+                    view.__name__, issued, limit))
+            return response
+        return wrapper
+    return decorator
+
+
+#----------------------------------------------------------------------------#
+# Statement timeouts
+#----------------------------------------------------------------------------#
+
+# SQLSTATE Postgres reports for a statement cancelled by statement_timeout.
+QUERY_CANCELED = '57014'
+
+
+def statement_timeout(setting):
+    # Tightens statement_timeout for the view's transaction to the number of
+    # milliseconds in config[setting]; a cancelled statement answers 503
+    # instead of holding the worker until the global timeout.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            timeout = current_app.config[setting]
+            if timeout and db.read_dialect() == 'postgresql':
+                db.session.execute(db.text('SET LOCAL statement_timeout = {:d}'.format(timeout)))
+            try:
+                return view(*args, **kwargs)
+            except OperationalError as e:
+                if getattr(e.orig, 'pgcode', None) != QUERY_CANCELED:
+                    raise
+                db.session.rollback()
+                abort(503)
+        return wrapper
+    return decorator
+
+
+#----------------------------------------------------------------------------#
+# Venues listing
+#----------------------------------------------------------------------------#
+
+def venue_areas_query():
+    # Upcoming counts are kept on the venue row by show_counts.py, so the
+    # listing is a plain scan of venue in page order: no join, no grouping.
+    return db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state, Venue.upcoming_show_count
+    ).order_by(
+        Venue.state, Venue.city, Venue.id
+    )
+
+
+def group_areas(rows):
+    # Rows arrive sorted by state and city, so each area is a contiguous run
+    # and a single pass is enough to build the city/state -> venues tree.
+    areas = []
+    for venue_id, name, city, state, num_upcoming_shows in rows:
+        if not areas or (areas[-1]["city"], areas[-1]["state"]) != (city, state):
+            areas.append({
+                "city": city,
+                "state": state,
+                "venues": []
+            })
+        areas[-1]["venues"].append(VenueSummary(venue_id, name, num_upcoming_shows))
+    return areas
+
+
+# Pages are cut on (state, city, id) so each page stays grouped by area;
+# an area that straddles two pages is simply repeated on the next one.
+VENUE_AREA_ORDER = (Venue.state, Venue.city, Venue.id)
+
+
+def venue_areas(cursor=None, page_size=None):
+    page = paginate(
+        venue_areas_query(),
+        columns=VENUE_AREA_ORDER,
+        key=lambda row: (row.state, row.city, row.id),
+        cursor=cursor, page_size=page_size)
+    return page._replace(items=group_areas(page.items))
+
+
+#----------------------------------------------------------------------------#
+# Artists listing
+#----------------------------------------------------------------------------#
+
+ARTIST_ORDER = (Artist.id,)
+
+
+def artists_page(cursor=None, page_size=None):
+    return paginate(
+        artist_summaries(),
+        columns=ARTIST_ORDER,
+        key=lambda artist: (artist.id,),
+        cursor=cursor, page_size=page_size,
+        fetch=lambda select: fetch(select, Summary))
+
+
+#----------------------------------------------------------------------------#
+# Shows listing
+#----------------------------------------------------------------------------#
+
+SHOW_ORDER = (Show.start_time, Show.id)
+
+
+def shows_query():
+    return Show.query.options(db.joinedload(Show.Venue), db.joinedload(Show.Artist))
+
+
+def shows_page(cursor=None, page_size=None):
+    return paginate(
+        show_summaries(),
+        columns=SHOW_ORDER,
+        key=lambda show: (show.start_time, show.id),
+        cursor=cursor, page_size=page_size,
+        fetch=lambda select: fetch(select, ShowSummary))
+
+
+#----------------------------------------------------------------------------#
+# Genre browsing
+#----------------------------------------------------------------------------#
+
+def genre_page(model, genre, cursor=None, page_size=None):
+    return paginate(
+        genre_members(model, genre),
+        columns=(GENRE_LINKS[model],),
+        key=lambda row: (row.id,),
+        cursor=cursor, page_size=page_size,
+        fetch=lambda select: fetch(select, PlaceSummary))
+
+
+def genre_totals(model):
+    return fetch(genre_counts(model), GenreCount)
+
+
+#----------------------------------------------------------------------------#
+# Detail pages
+#----------------------------------------------------------------------------#
+
+def split_shows(shows, current_time):
+    upcoming_shows, past_shows = [], []
+    for show in shows:
+        if show.start_time > current_time:
+            upcoming_shows.append(show)
+        else:
+            past_shows.append(show)
+    return upcoming_shows, past_shows
+
+
+def with_shows(entity_details, shows, serializer, current_time):
+    upcoming_shows, past_shows = split_shows(shows, current_time)
+    entity_details["upcoming_shows"] = list(map(serializer, upcoming_shows))
+    entity_details["upcoming_shows_count"] = len(upcoming_shows)
+    entity_details["past_shows"] = list(map(serializer, past_shows))
+    entity_details["past_shows_count"] = len(past_shows)
+    return entity_details
+
+
+def venue_shows_query(venue_id):
+    # The venue, its genres, all of its shows and each show's artist in one
+    # statement; the genre join repeats each show row once per genre and
+    # the ORM folds the repeats back together.
+    return db.session.query(Venue, Show).outerjoin(
+        Show, Show.venue_id == Venue.id
+    ).outerjoin(
+        Show.Artist
+    ).options(
+        db.contains_eager(Show.Artist),
+        db.joinedload(Venue.genre_list)
+    ).filter(
+        Venue.id == venue_id
+    ).order_by(Show.start_time, Show.id)
+
+
+def venue_page(venue_id, current_time=None):
+    if current_time is None:
+        current_time = datetime.now()
+    rows = venue_shows_query(venue_id).all()
+    if not rows:
+        return None
+    shows = [show for venue, show in rows if show is not None]
+    return with_shows(Venue.details(rows[0][0]), shows, Show.artist_details, current_time)
+
+
+def artist_shows_query(artist_id):
+    # The artist, its genres, all of its shows and each show's venue in one
+    # statement.
+    return db.session.query(Artist, Show).outerjoin(
+        Show, Show.artist_id == Artist.id
+    ).outerjoin(
+        Show.Venue
+    ).options(
+        db.contains_eager(Show.Venue),
+        db.joinedload(Artist.genre_list)
+    ).filter(
+        Artist.id == artist_id
+    ).order_by(Show.start_time, Show.id)
+
+
+def artist_page(artist_id, current_time=None):
+    if current_time is None:
+        current_time = datetime.now()
+    rows = artist_shows_query(artist_id).all()
+    if not rows:
+        return None
+    shows = [show for artist, show in rows if show is not None]
+    return with_shows(Artist.details(rows[0][0]), shows, Show.venue_details, current_time)
+
+
+#----------------------------------------------------------------------------#
+# Validators
+#----------------------------------------------------------------------------#
+
+# Each validator returns (fingerprint, last_modified) for a page from a
+# narrow query over version columns, or None when there is nothing to
+# validate. The fingerprint changes whenever the rendered page would.
+
+def venue_areas_validator(cursor=None):
+    # A rename or move bumps version; the upcoming count is rolled forward
+    # without touching it.
+    query = db.session.query(Venue.id, Venue.version, Venue.upcoming_show_count)
+    return seek(query, VENUE_AREA_ORDER, cursor)[0].all(), None
+
+
+def artists_validator(cursor=None):
+    query = seek(db.session.query(Artist.id, Artist.version), ARTIST_ORDER, cursor)[0]
+    return query.all(), None
+
+
+def shows_validator(cursor=None):
+    query = db.session.query(
+        Show.id, Show.version, Venue.version, Artist.version
+    ).join(Venue, Venue.id == Show.venue_id).join(Artist, Artist.id == Show.artist_id)
+    return seek(query, SHOW_ORDER, cursor)[0].all(), None
+
+
+def _detail_validator(entity, counterpart, owner_column, counterpart_column, entity_id):
+    current_time = datetime.now()
+    row = db.session.query(
+        entity.version,
+        entity.updated_at,
+        db.func.max(Show.updated_at),
+        db.func.max(counterpart.updated_at),
+        db.func.count(Show.id),
+        db.func.count(Show.id).filter(Show.start_time > current_time),
+        db.func.max(Show.start_time).filter(Show.start_time <= current_time),
+    ).outerjoin(
+        Show, owner_column == entity.id
+    ).outerjoin(
+        counterpart, counterpart.id == counterpart_column
+    ).filter(
+        entity.id == entity_id
+    ).group_by(entity.id, entity.version, entity.updated_at).first()
+    if row is None:
+        return None
+
+    # updated_at is stored in UTC; start_time is local wall-clock time and
+    # marks the moment the latest past show moved off the upcoming list.
+    changes = [value for value in row[1:4] if value is not None]
+    if row[6] is not None:
+        changes.append(row[6].astimezone(timezone.utc).replace(tzinfo=None))
+    return tuple(row), max(changes)
+
+
+def venue_validator(venue_id):
+    return _detail_validator(Venue, Artist, Show.venue_id, Show.artist_id, venue_id)
+
+
+def artist_validator(artist_id):
+    return _detail_validator(Artist, Venue, Show.artist_id, Show.venue_id, artist_id)
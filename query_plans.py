@@ -0,0 +1,173 @@
+import json
+import re
+import sys
+from urllib.parse import quote
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from extensions import db
+from models import Venue, Artist
+
+
+#----------------------------------------------------------------------------#
+# Query plan checks.
+#----------------------------------------------------------------------------#
+
+def capture_statements(client, method, url, data=None):
+    # Run one request through the test client and record every statement it
+    # sends to any database (the read views run on the replica binds), with
+    # its parameters and the engine that ran it. Infrastructure work, such
+    # as the full read that builds a typeahead index, is not a page query.
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if context is None or not context.execution_options.get('infrastructure'):
+            statements.append((conn.engine, statement, parameters))
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        response = client.open(url, method=method, data=data)
+        # Streamed pages run their queries while the body is consumed.
+        response.get_data()
+        response.close()
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
+    return response, statements
+
+
+def unindexed_scans(plan, estimates):
+    # With sequential scans disabled the planner walks a whole index instead
+    # when no index matches, so an index scan is only proof of an index when
+    # the predicate reaches it as an Index Cond (or the Recheck Cond of a
+    # bitmap scan). A scan that applies a Filter without one reads every row,
+    # which only costs nothing when the filter is expected to keep them all
+    # (an id batch covering a small table, say). Condition-less scans without
+    # a Filter are ordered walks cut short by a Limit, or the outer side of
+    # a join that reads the whole table anyway.
+    scans = []
+    node = plan.get('Node Type')
+    relation = plan.get('Relation Name')
+    if node == 'Seq Scan':
+        scans.append('seq scan on ' + relation)
+    elif (node in ('Index Scan', 'Index Only Scan', 'Bitmap Heap Scan') and 'Filter' in plan
+            and 'Index Cond' not in plan and 'Recheck Cond' not in plan
+            and not 0 < estimates.get(relation, 0) <= plan['Plan Rows']):
+        scans.append('unindexed filter on ' + relation)
+    for child in plan.get('Plans', []):
+        scans.extend(unindexed_scans(child, estimates))
+    return scans
+
+
+def table_rows(engine):
+    # The planner's row estimate for every table, as of the last ANALYZE.
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'p')")
+        rows = dict(cursor.fetchall())
+        connection.rollback()
+    finally:
+        connection.close()
+    return rows
+
+
+def explain(engine, statement, parameters):
+    # Hash and merge joins are off too: on a small development database they
+    # hide whether a join could be driven through an index, which is the
+    # plan the planner switches to once the tables grow.
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SET enable_seqscan = off')
+        cursor.execute('SET enable_hashjoin = off')
+        cursor.execute('SET enable_mergejoin = off')
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        connection.rollback()
+    finally:
+        connection.close()
+    return plan[0]['Plan']
+
+
+def next_page(response):
+    match = re.search(r'class="next"><a href="([^"]+)"', response.get_data(as_text=True))
+    return match.group(1).replace('&amp;', '&') if match else None
+
+
+def following_page(url, response):
+    # The second page of an HTML listing or of a JSON genre browse.
+    if response.is_json:
+        body = response.get_json()
+        cursor = body.get('next_cursor') if isinstance(body, dict) else None
+        return '{}?cursor={}'.format(url, quote(cursor)) if cursor else None
+    return next_page(response)
+
+
+def route_requests():
+    venue = Venue.query.order_by(Venue.id).first()
+    artist = Artist.query.order_by(Artist.id).first()
+    requests = [('GET', '/venues', None), ('GET', '/artists', None), ('GET', '/shows', None),
+                ('GET', '/api/v1/shows', None)]
+    for kind, entity in (('venues', venue), ('artists', artist)):
+        if entity is None:
+            continue
+        genre = entity.genres[0] if entity.genres else 'Jazz'
+        requests += [
+            ('GET', '/{}/{}'.format(kind, entity.id), None),
+            ('POST', '/{}/search'.format(kind), {'search_term': entity.name[:4]}),
+            ('GET', '/api/v1/{}'.format(kind), None),
+            ('GET', '/api/v1/{}/{}'.format(kind, entity.id), None),
+            ('GET', '/api/v1/{}/genres'.format(kind), None),
+            ('GET', '/api/v1/{}/genres/{}'.format(kind, quote(genre)), None),
+            ('GET', '/api/v1/{}/typeahead?q={}'.format(kind, quote(entity.name[:2])), None),
+        ]
+    return requests
+
+
+@click.command('check-query-plans')
+@with_appcontext
+def check_query_plans():
+    """EXPLAIN every read route's queries and fail on unindexed scans."""
+    if db.engine.dialect.name != 'postgresql':
+        raise click.ClickException('Query plans can only be checked against Postgres.')
+
+    current_app.config['WTF_CSRF_ENABLED'] = False
+    client = current_app.test_client()
+    failures = 0
+    estimates = {}
+    pending = route_requests()
+    while pending:
+        method, url, data = pending.pop(0)
+        response, statements = capture_statements(client, method, url, data)
+        # Follow the first "next" link too, so the keyset seek is checked.
+        if method == 'GET' and '?' not in url:
+            following = following_page(url, response)
+            if following:
+                pending.append(('GET', following, None))
+        for engine, statement, parameters in statements:
+            # Skip the SET LOCAL the statement timeout issues.
+            if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+                continue
+            if engine.dialect.name != 'postgresql':
+                # A SQLite stand-in replica has no comparable planner.
+                click.echo('{:<6} {:<40} skipped on {}'.format(method, url[:40], engine.dialect.name))
+                continue
+            if engine not in estimates:
+                estimates[engine] = table_rows(engine)
+            scans = unindexed_scans(explain(engine, statement, parameters), estimates[engine])
+            status = 'ok' if not scans else ', '.join(scans).upper()
+            click.echo('{:<6} {:<40} {}'.format(method, url[:40], status))
+            if scans:
+                failures += 1
+                click.echo('       ' + ' '.join(statement.split()))
+
+    if failures:
+        click.echo('{} statement(s) scanned rows no index narrowed'.format(failures))
+        sys.exit(1)
+    click.echo('All query plans use indexes')
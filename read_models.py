@@ -0,0 +1,66 @@
+from collections import namedtuple
+
+from extensions import db
+from models import Venue, Artist, Show, Genre, GENRE_LINKS
+
+
+#----------------------------------------------------------------------------#
+# Records.
+#----------------------------------------------------------------------------#
+
+# Listing and search pages only render a handful of columns, so they read
+# plain tuples from column-projected selects instead of full ORM entities:
+# no identity map, no change tracking, no per-row dict.
+
+Summary = namedtuple('Summary', ['id', 'name'])
+
+VenueSummary = namedtuple('VenueSummary', ['id', 'name', 'num_upcoming_shows'])
+
+ShowSummary = namedtuple('ShowSummary', [
+    'id', 'start_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name', 'artist_image_link'])
+
+PlaceSummary = namedtuple('PlaceSummary', ['id', 'name', 'city', 'state'])
+
+# A search match with its sort key; relevance is 0 when there is no term.
+SearchResult = namedtuple('SearchResult', ['id', 'name', 'city', 'state', 'relevance'])
+
+GenreCount = namedtuple('GenreCount', ['genre', 'count'])
+
+
+#----------------------------------------------------------------------------#
+# Selects.
+#----------------------------------------------------------------------------#
+
+def artist_summaries():
+    return db.select([Artist.id, Artist.name])
+
+
+def show_summaries():
+    return db.select([
+        Show.id, Show.start_time, Show.venue_id, Venue.name.label('venue_name'), Show.artist_id,
+        Artist.name.label('artist_name'), Artist.image_link,
+    ]).select_from(
+        Show.__table__.join(Venue.__table__, Venue.id == Show.venue_id)
+                      .join(Artist.__table__, Artist.id == Show.artist_id))
+
+
+def genre_members(model, genre):
+    # Walks the link table's (genre_id, owner) index, so pages come out in
+    # owner id order without a sort.
+    owner = GENRE_LINKS[model]
+    return db.select([model.id, model.name, model.city, model.state]).select_from(
+        Genre.__table__.join(owner.table).join(model.__table__, model.id == owner)
+    ).where(Genre.name == genre)
+
+
+def genre_counts(model):
+    # Every genre with its number of venues or artists in one grouped
+    # statement over the same index; genres nobody carries count 0.
+    owner = GENRE_LINKS[model]
+    return db.select([Genre.name, db.func.count(owner)]).select_from(
+        Genre.__table__.outerjoin(owner.table)
+    ).group_by(Genre.id, Genre.name).order_by(Genre.id)
+
+
+def fetch(select, record):
+    return [record._make(row) for row in db.session.execute(select)]
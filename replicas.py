@@ -0,0 +1,202 @@
+import itertools
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm, text
+from sqlalchemy.exc import SQLAlchemyError
+
+
+# Flask session key holding the time until which reads stay on the primary.
+PRIMARY_UNTIL = '_read_primary_until'
+
+
+#----------------------------------------------------------------------------#
+# Replica health.
+#----------------------------------------------------------------------------#
+
+class ReplicaSet(object):
+    # Round-robin over the replica binds, skipping any that failed their
+    # last health check. Checks run inline at most once per interval per
+    # replica, so a healthy set costs one SELECT every few seconds.
+
+    def __init__(self, keys, create_engine, interval, max_lag):
+        self.keys = keys
+        self.create_engine = create_engine
+        self.interval = interval
+        self.max_lag = max_lag
+        self.lock = threading.Lock()
+        self.order = itertools.cycle(range(len(keys)))
+        self.engines = [None] * len(keys)
+        self.checked = [0.0] * len(keys)
+        self.healthy = [True] * len(keys)
+
+    def check(self, index):
+        try:
+            # Engines are built on first check, so a bind that cannot even
+            # be created (a bad URL, a missing driver) is only unhealthy.
+            if self.engines[index] is None:
+                self.engines[index] = self.create_engine(self.keys[index])
+            engine = self.engines[index]
+            with engine.connect() as connection:
+                # Not one of the page's queries; see statement_budget.
+                connection = connection.execution_options(infrastructure=True)
+                if engine.dialect.name == 'postgresql':
+                    # Standbys report how far behind the primary they are;
+                    # a stand-in replica that is not in recovery reports 0.
+                    lag = connection.execute(text(
+                        'SELECT CASE WHEN pg_is_in_recovery() THEN EXTRACT(EPOCH FROM '
+                        'now() - pg_last_xact_replay_timestamp()) ELSE 0 END')).scalar()
+                    return lag is not None and lag <= self.max_lag
+                connection.execute(text('SELECT 1'))
+                return True
+        except (SQLAlchemyError, TypeError, ImportError):
+            current_app.logger.warning('Replica %s failed its health check', self.keys[index],
+                                       exc_info=True)
+            return False
+
+    def is_healthy(self, index):
+        now = time.time()
+        with self.lock:
+            if now - self.checked[index] < self.interval:
+                return self.healthy[index]
+            self.checked[index] = now
+        healthy = self.check(index)
+        with self.lock:
+            self.healthy[index] = healthy
+        return healthy
+
+    def pick(self):
+        for _ in range(len(self.keys)):
+            with self.lock:
+                index = next(self.order)
+            if self.is_healthy(index):
+                return self.engines[index]
+        return None
+
+
+def replica_keys(app):
+    return sorted(key for key in app.config.get('SQLALCHEMY_BINDS') or {}
+                  if key.startswith('replica_'))
+
+
+#----------------------------------------------------------------------------#
+# Routing session.
+#----------------------------------------------------------------------------#
+
+def request_replica(db_session, pick):
+    # Inside a @read_only view every statement goes to one replica, picked
+    # once per request so the page reads a single snapshot. Flushes, and
+    # every other view, use the primary (None).
+    if not db_session._flushing and has_request_context() and g.get('read_only'):
+        if 'replica' not in g:
+            g.replica = pick()
+        return g.replica
+    return None
+
+
+def _note_write(db_session, flush_context):
+    db_session.info['wrote'] = True
+
+
+def _read_own_writes(db_session):
+    # The visitor who wrote keeps reading from the primary until the
+    # replicas have had time to catch up.
+    if db_session.info.pop('wrote', False) and has_request_context():
+        session[PRIMARY_UNTIL] = time.time() + current_app.config['READ_YOUR_WRITES_WINDOW']
+
+
+def _discard_write(db_session):
+    db_session.info.pop('wrote', None)
+
+
+def track_writes(session_class):
+    # Read-your-writes bookkeeping for a session class that routes reads.
+    event.listen(session_class, 'after_flush', _note_write)
+    event.listen(session_class, 'after_commit', _read_own_writes)
+    event.listen(session_class, 'after_rollback', _discard_write)
+    return session_class
+
+
+@track_writes
+class RoutingSession(SignallingSession):
+
+    def __init__(self, db, **options):
+        self.db = db
+        SignallingSession.__init__(self, db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica = request_replica(self, self.db.pick_replica)
+        if replica is not None:
+            return replica
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def __init__(self, *args, **kwargs):
+        self.replicas = None
+        SQLAlchemy.__init__(self, *args, **kwargs)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        # Called once per bind, so pool and session settings meant for
+        # Postgres never reach a SQLite replica's engine.
+        sa_url, options = SQLAlchemy.apply_driver_hacks(self, app, sa_url, options)
+        if sa_url.get_backend_name() == 'postgresql':
+            options.update(app.config['POSTGRES_ENGINE_OPTIONS'])
+        return sa_url, options
+
+    def get_binds(self, app=None):
+        # Replica binds map no tables; get_bind routes to them per request.
+        # Leaving them out here means opening a session never builds (or
+        # fails on) a replica's engine.
+        app = self.get_app(app)
+        binds = {}
+        for bind in [None] + list(app.config.get('SQLALCHEMY_BINDS') or ()):
+            if bind is not None and bind.startswith('replica_'):
+                continue
+            engine = self.get_engine(app, bind)
+            binds.update((table, engine) for table in self.get_tables_for_bind(bind))
+        return binds
+
+    def pick_replica(self):
+        app = self.get_app()
+        if self.replicas is None:
+            self.replicas = ReplicaSet(
+                replica_keys(app), lambda key: self.get_engine(app, bind=key),
+                app.config['REPLICA_HEALTH_INTERVAL'], app.config['REPLICA_MAX_LAG'])
+        if not self.replicas.keys:
+            return None
+        return self.replicas.pick()
+
+    def dispose_engines(self, app):
+        # Drops every pooled connection, replicas included. Called around a
+        # fork: a connection shared by two processes corrupts both ends.
+        with app.app_context():
+            for bind in [None] + list(app.config.get('SQLALCHEMY_BINDS') or {}):
+                try:
+                    engine = self.get_engine(app, bind=bind)
+                except (SQLAlchemyError, TypeError, ImportError):
+                    # A broken replica bind is skipped by the health checks.
+                    continue
+                engine.dispose()
+
+    def read_dialect(self):
+        # The dialect this request's reads run on: a replica's inside a
+        # @read_only view, which need not match the primary's.
+        return self.session.get_bind().dialect.name
+
+
+def read_only(view):
+    # Marks a view as safe to answer from a replica, unless this visitor
+    # wrote something within the last READ_YOUR_WRITES_WINDOW seconds.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = session.get(PRIMARY_UNTIL, 0) < time.time()
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,214 @@
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from extensions import db
+from forms import GENRES
+from models import Genre
+
+
+#----------------------------------------------------------------------------#
+# N-gram inverted index.
+#----------------------------------------------------------------------------#
+
+def normalize(text):
+    return ' '.join((text or '').lower().split())
+
+
+def trigrams(text):
+    # Same padding as pg_trgm: two spaces before and one after every word,
+    # so ranking from the fallback index lines up with similarity().
+    grams = set()
+    for word in normalize(text).split(' '):
+        if word:
+            padded = '  ' + word + ' '
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(left, right):
+    left, right = trigrams(left), trigrams(right)
+    if not left or not right:
+        return 0.0
+    return len(left & right) / float(len(left | right))
+
+
+class NgramIndex(object):
+    # In-process stand-in for the pg_trgm indexes, used when the database is
+    # not Postgres (e.g. a local SQLite file). Every process keeps its own
+    # copy, so it only sees writes committed through that process.
+
+    def __init__(self, n=3):
+        self.n = n
+        self.lock = threading.RLock()
+        self.documents = {}
+        self.postings = defaultdict(set)
+        self.keywords = defaultdict(set)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def _substring_grams(self, text):
+        return set(text[i:i + self.n] for i in range(len(text) - self.n + 1))
+
+    def add(self, doc_id, name, city=None, state=None, genres=None):
+        with self.lock:
+            self.remove(doc_id)
+            fields = (normalize(name), normalize(city))
+            keywords = set(normalize(value) for value in [state] + list(genres or []) if value)
+            self.documents[doc_id] = (fields, keywords)
+            for field in fields:
+                for gram in self._substring_grams(field):
+                    self.postings[gram].add(doc_id)
+            for keyword in keywords:
+                self.keywords[keyword].add(doc_id)
+
+    def remove(self, doc_id):
+        with self.lock:
+            document = self.documents.pop(doc_id, None)
+            if document is None:
+                return
+            fields, keywords = document
+            for field in fields:
+                for gram in self._substring_grams(field):
+                    self.postings[gram].discard(doc_id)
+            for keyword in keywords:
+                self.keywords[keyword].discard(doc_id)
+
+    def matches(self, term):
+        # Ids whose name or city contains the term, or whose state or one of
+        # whose genres is the term: the same rows term_conditions selects on
+        # Postgres.
+        term = normalize(term)
+        if not term:
+            return set()
+        with self.lock:
+            if len(term) < self.n:
+                candidates = set(self.documents)
+            else:
+                grams = self._substring_grams(term)
+                candidates = set.intersection(*(self.postings.get(gram, set()) for gram in grams))
+            found = set(doc_id for doc_id in candidates
+                        if any(term in field for field in self.documents[doc_id][0]))
+            return found | self.keywords.get(term, set())
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(model):
+    index = _indexes.get(model)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(model)
+            if index is None:
+                index = NgramIndex()
+                # One row per genre link; a document is added once its last
+                # row has been read. The build is not one of the page's
+                # queries, even when a search triggers it.
+                rows = db.session.query(
+                    model.id, model.name, model.city, model.state, Genre.name
+                ).outerjoin(model.genre_list).order_by(model.id).execution_options(
+                    infrastructure=True)
+                document, genres = None, []
+                for doc_id, name, city, state, genre in rows:
+                    if document is not None and document[0] != doc_id:
+                        index.add(*document, genres=genres)
+                        genres = []
+                    document = (doc_id, name, city, state)
+                    if genre is not None:
+                        genres.append(genre)
+                if document is not None:
+                    index.add(*document, genres=genres)
+                _indexes[model] = index
+    return index
+
+
+# Keep built fallback indexes current. Changes are captured at flush time,
+# while the row values are still loaded, and only applied once the
+# transaction commits so a rollback never leaks into search results. A
+# process that never built an index (any process on Postgres) skips this.
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changes(session, flush_context):
+    if not _indexes:
+        return
+    pending = session.info.setdefault('search_changes', [])
+    for instance in list(session.new) + list(session.dirty):
+        if type(instance) in _indexes:
+            pending.append((type(instance), instance.id, (
+                instance.name, instance.city, instance.state, list(instance.genres))))
+    for instance in session.deleted:
+        if type(instance) in _indexes:
+            pending.append((type(instance), instance.id, None))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_changes(session):
+    for model, doc_id, values in session.info.pop('search_changes', []):
+        index = _indexes.get(model)
+        if index is None:
+            continue
+        if values is None:
+            index.remove(doc_id)
+        else:
+            index.add(doc_id, *values)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('search_changes', None)
+
+
+@event.listens_for(Engine, 'connect')
+def _register_similarity(dbapi_connection, connection_record):
+    # SQLite (sqlite3 and aiosqlite alike) can rank with the same trigram
+    # similarity as pg_trgm; Postgres drivers have no create_function.
+    create_function = getattr(dbapi_connection, 'create_function', None)
+    if create_function is not None:
+        create_function('similarity', 2, similarity)
+
+
+#----------------------------------------------------------------------------#
+# Search conditions.
+#----------------------------------------------------------------------------#
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def matching_genres(term):
+    term = normalize(term)
+    return [value for value, label in GENRES if normalize(value) == term]
+
+
+def term_conditions(model, term):
+    # On Postgres every predicate here is served by an index from the search
+    # migration: trigram GIN on name and city, b-tree on state, and the
+    # genre link table's primary key for the genre match. Any one of them
+    # matching is a hit. Other databases (including a SQLite replica) look
+    # the term up in the in-process n-gram index instead.
+    if db.read_dialect() != 'postgresql':
+        matches = db.bindparam('search_matches', sorted(get_index(model).matches(term)),
+                               expanding=True, literal_execute=True, unique=True)
+        return [model.id.in_(matches)]
+    pattern = '%' + escape_like(term) + '%'
+    conditions = [
+        model.name.ilike(pattern, escape='\\'),
+        model.city.ilike(pattern, escape='\\'),
+        model.state == term.upper(),
+    ]
+    genres = matching_genres(term)
+    if genres:
+        conditions.append(model.genre_list.any(Genre.name.in_(genres)))
+    return conditions
+
+
+def relevance(model, term):
+    # Ascending sort key, best match first: trigram similarity of the name,
+    # negated so it can lead a keyset (see pagination.seek). Cast to double
+    # so the value a cursor carries compares equal to the one recomputed.
+    return -db.cast(db.func.similarity(model.name, term), db.Float)
@@ -0,0 +1,156 @@
+from collections import defaultdict
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, event, inspect
+
+from extensions import db
+from cache import response_cache
+from models import Venue, Artist, Show, ShowCountState
+
+
+#----------------------------------------------------------------------------#
+# Watermark.
+#----------------------------------------------------------------------------#
+
+def rolled_at(connection, for_update=False):
+    # Writers share-lock the row and the roll-forward job locks it
+    # exclusively, so no show is ever bucketed against a watermark that is
+    # moving at the same time. SQLite ignores the locking clause.
+    table = ShowCountState.__table__
+    query = db.select([table.c.rolled_at]).where(table.c.id == 1).with_for_update(read=not for_update)
+    value = connection.execute(query).scalar()
+    if value is None:
+        value = datetime.now()
+        connection.execute(table.insert().values(id=1, rolled_at=value))
+    return value
+
+
+def set_rolled_at(connection, value):
+    table = ShowCountState.__table__
+    connection.execute(table.update().where(table.c.id == 1).values(rolled_at=value))
+
+
+#----------------------------------------------------------------------------#
+# Incremental maintenance.
+#----------------------------------------------------------------------------#
+
+def _values(show, history=False):
+    # The show's venue, artist and start time, as committed when `history`
+    # is set and as about to be written otherwise.
+    values = []
+    for attribute in ('venue_id', 'artist_id', 'start_time'):
+        state = inspect(show).attrs[attribute]
+        if history and state.history.deleted:
+            values.append(state.history.deleted[0])
+        elif history and state.history.unchanged:
+            values.append(state.history.unchanged[0])
+        else:
+            values.append(state.value)
+    return values
+
+
+def show_changes(session):
+    changes = []
+    for instance in session.new:
+        if isinstance(instance, Show):
+            changes.append((_values(instance), 1))
+    for instance in session.deleted:
+        if isinstance(instance, Show):
+            changes.append((_values(instance, history=True), -1))
+    for instance in session.dirty:
+        if isinstance(instance, Show) and session.is_modified(instance):
+            changes.append((_values(instance, history=True), -1))
+            changes.append((_values(instance), 1))
+    return changes
+
+
+def apply_changes(connection, changes):
+    watermark = rolled_at(connection)
+    deltas = defaultdict(lambda: [0, 0])
+    for (venue_id, artist_id, start_time), sign in changes:
+        bucket = 0 if start_time > watermark else 1
+        deltas[Venue, int(venue_id)][bucket] += sign
+        deltas[Artist, int(artist_id)][bucket] += sign
+    for (model, row_id), (upcoming, past) in deltas.items():
+        if upcoming or past:
+            table = model.__table__
+            connection.execute(table.update().where(table.c.id == row_id).values(
+                upcoming_show_count=table.c.upcoming_show_count + upcoming,
+                past_show_count=table.c.past_show_count + past))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _count_shows(session, flush_context):
+    # Runs inside the flush's transaction, so the counts commit or roll back
+    # together with the shows themselves.
+    changes = show_changes(session)
+    if changes:
+        apply_changes(session.connection(), changes)
+
+
+#----------------------------------------------------------------------------#
+# Roll forward and rebuild.
+#----------------------------------------------------------------------------#
+
+def roll_forward(now=None):
+    # Moves shows that started since the last run from upcoming to past,
+    # touching only the venues and artists that had such a show.
+    if now is None:
+        now = datetime.now()
+    connection = db.session.connection()
+    watermark = rolled_at(connection, for_update=True)
+    moved, tags = 0, set()
+    if now > watermark:
+        for model, owner in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+            rows = connection.execute(
+                db.select([owner, db.func.count(Show.id)]).where(
+                    db.and_(Show.start_time > watermark, Show.start_time <= now)
+                ).group_by(owner)).fetchall()
+            if rows:
+                table = model.__table__
+                connection.execute(table.update().where(table.c.id == bindparam('row_id')).values(
+                    upcoming_show_count=table.c.upcoming_show_count - bindparam('moved'),
+                    past_show_count=table.c.past_show_count + bindparam('moved')),
+                    [{'row_id': row_id, 'moved': count} for row_id, count in rows])
+                tags.update('{}:{}'.format(table.name, row_id) for row_id, count in rows)
+                if model is Venue:
+                    moved = sum(count for row_id, count in rows)
+        set_rolled_at(connection, now)
+    db.session.commit()
+    if tags:
+        # The counters are written through Core, out of sight of the cache's
+        # session listeners, so the affected pages are evicted here.
+        response_cache.invalidate(tags, everywhere=True)
+    return moved
+
+
+def rebuild(now=None):
+    # Recounts everything from the show table; for bulk loads that bypass
+    # the session, and to repair drift.
+    if now is None:
+        now = datetime.now()
+    connection = db.session.connection()
+    rolled_at(connection, for_update=True)
+    for model, owner in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+        table = model.__table__
+        shows = db.select([db.func.count(Show.id)]).where(owner == table.c.id)
+        connection.execute(table.update().values(
+            upcoming_show_count=shows.where(Show.start_time > now).scalar_subquery(),
+            past_show_count=shows.where(Show.start_time <= now).scalar_subquery()))
+    set_rolled_at(connection, now)
+    db.session.commit()
+    response_cache.invalidate({'venues'}, everywhere=True)
+
+
+@click.command('roll-show-counts')
+@click.option('--rebuild', 'full', is_flag=True, help='Recount every venue and artist from scratch.')
+@with_appcontext
+def roll_show_counts(full):
+    """Move started shows from upcoming to past; run every minute from cron."""
+    if full:
+        rebuild()
+        click.echo('Show counts rebuilt')
+    else:
+        click.echo('{} show(s) moved from upcoming to past'.format(roll_forward()))
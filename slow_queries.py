@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from flask import abort, current_app, has_request_context, render_template, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+
+#----------------------------------------------------------------------------#
+# Slow query log.
+#----------------------------------------------------------------------------#
+
+def printable(parameters):
+    # Bound parameters as they would appear in JSON, whatever their type.
+    return json.loads(json.dumps(parameters, default=str))
+
+
+class SlowQueryLog(object):
+    # Statements slower than SLOW_QUERY_THRESHOLD_MS are kept in a ring
+    # buffer and written to a rotating JSON log. A sample of the slow SELECTs
+    # is re-run under EXPLAIN (ANALYZE, BUFFERS) by a background thread on
+    # its own connection, so the request that hit the slow statement never
+    # waits for its plan.
+
+    def __init__(self, app=None):
+        self.entries = deque()
+        self.reset()
+        # The explain thread does not survive a fork (gunicorn's preload), and
+        # a lock held by another thread at the time would stay held forever.
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.reset)
+        if app is not None:
+            self.init_app(app)
+
+    def reset(self):
+        self.lock = threading.Lock()
+        self.starting = threading.Lock()
+        self.pending = None
+
+    def init_app(self, app):
+        self.threshold = app.config['SLOW_QUERY_THRESHOLD_MS'] / 1000.0
+        self.sample_rate = app.config['SLOW_QUERY_EXPLAIN_SAMPLE_RATE']
+        self.entries = deque(maxlen=app.config['SLOW_QUERY_BUFFER_SIZE'])
+
+        self.logger = logging.getLogger('fyyur.slow_queries')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        if app.config['SLOW_QUERY_LOG'] and not self.logger.handlers:
+            handler = RotatingFileHandler(
+                app.config['SLOW_QUERY_LOG'], maxBytes=app.config['SLOW_QUERY_LOG_MAX_BYTES'],
+                backupCount=app.config['SLOW_QUERY_LOG_BACKUPS'])
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+
+        # Every engine, not just the primary: the read views run on the
+        # replica binds. Registered once however many apps are created.
+        if not event.contains(Engine, 'before_cursor_execute', self.start):
+            event.listen(Engine, 'before_cursor_execute', self.start)
+            event.listen(Engine, 'after_cursor_execute', self.finish)
+        app.add_url_rule('/debug/slow-queries', 'slow_queries', self.view)
+
+    def start(self, conn, cursor, statement, parameters, context, executemany):
+        context.slow_query_started = time.perf_counter()
+
+    def finish(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'slow_query_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        if elapsed < self.threshold:
+            return
+
+        entry = {
+            'time': datetime.utcnow().isoformat() + 'Z',
+            'duration_ms': round(elapsed * 1000, 2),
+            'statement': ' '.join(statement.split()),
+            'database': conn.engine.url.render_as_string(hide_password=True),
+            'parameters': printable(parameters),
+            'view': request.endpoint if has_request_context() else None,
+            'path': request.full_path if has_request_context() else None,
+            'plan': None,
+        }
+        with self.lock:
+            self.entries.append(entry)
+        if self.should_explain(conn.engine, statement, executemany):
+            self.explain_later(entry, conn.engine, statement, parameters)
+        else:
+            self.write(entry)
+
+    def should_explain(self, engine, statement, executemany):
+        # ANALYZE really runs the statement, so only plain SELECTs qualify.
+        # The explain thread has no event loop to drive an async driver.
+        return (engine.dialect.name == 'postgresql' and not engine.dialect.is_async
+                and not executemany
+                and statement.lstrip().upper().startswith('SELECT')
+                and random.random() < self.sample_rate)
+
+    def explain_later(self, entry, engine, statement, parameters):
+        pending = self.pending
+        if pending is None:
+            # Request threads can race here; only one may start the worker.
+            with self.starting:
+                if self.pending is None:
+                    self.pending = queue.Queue(maxsize=16)
+                    worker = threading.Thread(target=self.explain_worker, args=(self.pending,),
+                                              name='slow-query-explain')
+                    worker.daemon = True
+                    worker.start()
+                pending = self.pending
+        try:
+            pending.put_nowait((entry, engine, statement, parameters))
+        except queue.Full:
+            # Under a burst of slow statements plans are dropped, not queued.
+            self.write(entry)
+
+    def explain_worker(self, pending):
+        while True:
+            entry, engine, statement, parameters = pending.get()
+            try:
+                # On the database that ran it: a replica's plan and timings
+                # can differ from the primary's.
+                entry['plan'] = self.explain(engine, statement, parameters)
+            except Exception as e:
+                entry['plan'] = 'EXPLAIN failed: {}'.format(e)
+            self.write(entry)
+
+    def explain(self, engine, statement, parameters):
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + statement, parameters)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            connection.rollback()
+        finally:
+            connection.close()
+        return plan
+
+    def write(self, entry):
+        self.logger.info(json.dumps(entry, sort_keys=True))
+
+    def recent(self):
+        with self.lock:
+            return list(reversed(self.entries))
+
+    def view(self):
+        if not current_app.config['SLOW_QUERY_DEBUG_PAGE']:
+            abort(404)
+        return render_template('pages/slow_queries.html', entries=self.recent(),
+                               threshold=self.threshold * 1000)
+
+
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,125 @@
+// Name suggestions for inputs with a data-typeahead URL. Picking one fills
+// the input named by data-target with the suggestion's id.
+(function () {
+  var DELAY = 120;
+
+  function Typeahead(input) {
+    this.input = input;
+    this.url = input.getAttribute('data-typeahead');
+    this.target = document.getElementById(input.getAttribute('data-target'));
+    this.menu = document.createElement('ul');
+    this.menu.className = 'dropdown-menu';
+    input.parentNode.appendChild(this.menu);
+    this.items = [];
+    this.active = -1;
+    this.cache = {};
+    this.sequence = 0;
+    this.timer = null;
+
+    var self = this;
+    input.addEventListener('input', function () {
+      clearTimeout(self.timer);
+      self.timer = setTimeout(function () { self.fetch(input.value); }, DELAY);
+    });
+    input.addEventListener('keydown', function (event) { self.keydown(event); });
+    input.addEventListener('blur', function () {
+      setTimeout(function () { self.close(); }, 150);
+    });
+    this.menu.addEventListener('mousedown', function (event) {
+      var item = event.target.closest('li');
+      if (item) {
+        event.preventDefault();
+        self.choose(Number(item.getAttribute('data-index')));
+      }
+    });
+  }
+
+  Typeahead.prototype.fetch = function (query) {
+    var self = this, sequence = ++this.sequence;
+    query = query.trim();
+    if (!query) {
+      return this.close();
+    }
+    if (this.cache.hasOwnProperty(query)) {
+      return this.show(this.cache[query]);
+    }
+    var request = new XMLHttpRequest();
+    request.open('GET', this.url + '?q=' + encodeURIComponent(query));
+    request.onload = function () {
+      if (request.status !== 200) {
+        return;
+      }
+      var data = JSON.parse(request.responseText).data;
+      self.cache[query] = data;
+      // A slower reply to an earlier keystroke must not replace this one.
+      if (sequence === self.sequence) {
+        self.show(data);
+      }
+    };
+    request.send();
+  };
+
+  Typeahead.prototype.show = function (items) {
+    this.items = items;
+    this.active = -1;
+    this.menu.innerHTML = '';
+    for (var i = 0; i < items.length; i++) {
+      var item = document.createElement('li'), link = document.createElement('a');
+      var location = document.createElement('small');
+      item.setAttribute('data-index', i);
+      link.href = '#';
+      link.textContent = items[i].name + ' ';
+      location.className = 'text-muted';
+      location.textContent = items[i].location;
+      link.appendChild(location);
+      item.appendChild(link);
+      this.menu.appendChild(item);
+    }
+    this.menu.style.display = items.length ? 'block' : 'none';
+  };
+
+  Typeahead.prototype.close = function () {
+    this.menu.style.display = 'none';
+    this.active = -1;
+  };
+
+  Typeahead.prototype.highlight = function (index) {
+    var children = this.menu.children;
+    for (var i = 0; i < children.length; i++) {
+      children[i].className = i === index ? 'active' : '';
+    }
+    this.active = index;
+  };
+
+  Typeahead.prototype.keydown = function (event) {
+    if (this.menu.style.display !== 'block') {
+      return;
+    }
+    if (event.key === 'ArrowDown') {
+      event.preventDefault();
+      this.highlight(Math.min(this.active + 1, this.items.length - 1));
+    } else if (event.key === 'ArrowUp') {
+      event.preventDefault();
+      this.highlight(Math.max(this.active - 1, 0));
+    } else if (event.key === 'Enter' && this.active >= 0) {
+      event.preventDefault();
+      this.choose(this.active);
+    } else if (event.key === 'Escape') {
+      this.close();
+    }
+  };
+
+  Typeahead.prototype.choose = function (index) {
+    var item = this.items[index];
+    this.input.value = item.name;
+    if (this.target) {
+      this.target.value = item.id;
+    }
+    this.close();
+  };
+
+  var inputs = document.querySelectorAll('input[data-typeahead]');
+  for (var i = 0; i < inputs.length; i++) {
+    new Typeahead(inputs[i]);
+  }
+})();
@@ -0,0 +1,90 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import search
+import typeahead
+from app import create_app
+from extensions import db
+from models import Venue, Artist, Show
+
+
+@pytest.fixture
+def app(tmp_path):
+    # A fresh SQLite file per test. Every path the app writes to lives in
+    # tmp_path, and DEBUG keeps it from logging to the tracked error.log.
+    settings = dict((name, getattr(config, name)) for name in dir(config) if name.isupper())
+    settings.update(
+        DEBUG=True,
+        TESTING=True,
+        SECRET_KEY='test',
+        WTF_CSRF_ENABLED=False,
+        ENFORCE_STATEMENT_BUDGETS=True,
+        SQLALCHEMY_DATABASE_URI='sqlite:///' + str(tmp_path / 'fyyur.db'),
+        SQLALCHEMY_BINDS={},
+        JINJA_BYTECODE_CACHE_DIR=None,
+        RESPONSE_CACHE_BACKEND='memory',
+        RESPONSE_CACHE_GENERATION_PATH=str(tmp_path / 'response_cache.generation'),
+        TYPEAHEAD_GENERATION_PATH=str(tmp_path / 'typeahead.generation'),
+        SLOW_QUERY_LOG=str(tmp_path / 'slow_queries.log'),
+    )
+    app = create_app(type('TestConfig', (object,), settings))
+    with app.app_context():
+        db.create_all()
+    # The in-process indexes outlive an app; drop the previous test's.
+    search._indexes.clear()
+    typeahead._indexes.clear()
+    db.replicas = None
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def add_venue(name, city='San Francisco', state='CA', genres=('Jazz',)):
+    venue = Venue(name=name, city=city, state=state, address='1 Main St', phone='123-123-1234',
+                  website_link='http://example.com', genres=list(genres),
+                  image_link='http://example.com/v.png', facebook_link='http://facebook.com/v')
+    db.session.add(venue)
+    db.session.commit()
+    return venue.id
+
+
+def add_artist(name, city='San Francisco', state='CA', genres=('Jazz',)):
+    artist = Artist(name=name, genres=list(genres), city=city, state=state, phone='123-123-1234',
+                    website_link='http://example.com', image_link='http://example.com/a.png',
+                    facebook_link='http://facebook.com/a')
+    db.session.add(artist)
+    db.session.commit()
+    return artist.id
+
+
+def add_show(venue_id, artist_id, days):
+    show = Show(venue_id=venue_id, artist_id=artist_id,
+                start_time=datetime.now() + timedelta(days=days))
+    db.session.add(show)
+    db.session.commit()
+    return show.id
+
+
+@pytest.fixture
+def listings(app):
+    # A handful of venues and artists in two cities, each with past and
+    # upcoming shows; returns the ids of each.
+    with app.app_context():
+        venues = [add_venue('Venue {}'.format(i), city=('Oakland' if i % 2 else 'San Francisco'))
+                  for i in range(7)]
+        artists = [add_artist('Artist {}'.format(i)) for i in range(7)]
+        shows = [add_show(venues[i % 7], artists[(i * 3) % 7], days=(i - 5) * 7)
+                 for i in range(14)]
+    return venues, artists, shows
@@ -0,0 +1,64 @@
+from cache import response_cache
+from conftest import add_show, add_venue
+from extensions import db
+from models import Venue, Artist
+
+
+def cached(path):
+    return response_cache.backend.get(path + '?') is not None
+
+
+def test_detail_page_is_evicted_when_its_venue_changes(app, client, listings):
+    venues, artists, shows = listings
+    path = '/venues/{}'.format(venues[0])
+    assert 'Venue 0' in client.get(path).get_data(as_text=True)
+    assert cached(path)
+
+    with app.app_context():
+        Venue.query.get(venues[0]).name = 'Renamed Hall'
+        db.session.commit()
+    assert not cached(path)
+    assert 'Renamed Hall' in client.get(path).get_data(as_text=True)
+
+
+def test_detail_page_is_evicted_when_an_artist_it_lists_changes(app, client, listings):
+    venues, artists, shows = listings
+    path = '/venues/{}'.format(venues[0])
+    client.get(path).get_data()
+    assert cached(path)
+
+    # Show 0 puts artist 0 on venue 0's page.
+    with app.app_context():
+        Artist.query.get(artists[0]).name = 'Renamed Artist'
+        db.session.commit()
+    assert not cached(path)
+    assert 'Renamed Artist' in client.get(path).get_data(as_text=True)
+
+
+def test_listings_are_evicted_by_new_rows(app, client, listings):
+    venues, artists, shows = listings
+    for path in ('/venues', '/shows'):
+        client.get(path).get_data()
+        assert cached(path)
+
+    with app.app_context():
+        venue_id = add_venue('Brand New Venue', city='Berkeley')
+    assert not cached('/venues')
+    assert 'Berkeley' in client.get('/venues').get_data(as_text=True)
+
+    with app.app_context():
+        add_show(venue_id, artists[1], days=3)
+    assert not cached('/shows')
+    assert 'Brand New Venue' in client.get('/shows').get_data(as_text=True)
+
+
+def test_rolled_back_writes_keep_the_cache(app, client, listings):
+    venues, artists, shows = listings
+    path = '/venues/{}'.format(venues[0])
+    client.get(path).get_data()
+
+    with app.app_context():
+        Venue.query.get(venues[0]).name = 'Never Saved'
+        db.session.flush()
+        db.session.rollback()
+    assert cached(path)
@@ -0,0 +1,92 @@
+import base64
+import json
+import re
+from datetime import datetime
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor
+from queries import ARTIST_ORDER, SHOW_ORDER, VENUE_AREA_ORDER, artists_page, shows_page
+
+
+def raw_cursor(direction, values):
+    payload = json.dumps([direction, values]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+
+def strip_tokens(html):
+    # Each response masks the CSRF token afresh.
+    return re.sub(r'name="csrf_token" value="[^"]*"', '', html)
+
+
+def walk(app, page_function, key, page_size):
+    # Every row, following next cursors forward and then prev cursors back.
+    forward, backward, cursor = [], [], None
+    with app.test_request_context():
+        while True:
+            page = page_function(cursor=cursor, page_size=page_size)
+            forward.extend(key(row) for row in page.items)
+            if page.next_cursor is None:
+                break
+            cursor = page.next_cursor
+        while cursor is not None:
+            page = page_function(cursor=cursor, page_size=page_size)
+            backward[:0] = [key(row) for row in page.items]
+            cursor = page.prev_cursor
+    return forward, backward
+
+
+def test_cursor_round_trip():
+    values = [datetime(2031, 6, 13, 20, 0, 0, 123456), 42]
+    assert decode_cursor(encode_cursor(values, 'prev'), SHOW_ORDER) == (values, 'prev')
+
+
+@pytest.mark.parametrize('cursor', [
+    raw_cursor('next', [42]),
+    raw_cursor('next', [{'dt': '2031-06-13T20:00:00'}, 42, 1]),
+    raw_cursor('next', ['2031-06-13T20:00:00', 42]),
+    raw_cursor('next', [{'dt': 'yesterday'}, 42]),
+    raw_cursor('next', [{'dt': '2031-06-13T20:00:00'}, '42']),
+    raw_cursor('next', [{'dt': '2031-06-13T20:00:00'}, True]),
+    raw_cursor('next', [{'dt': '2031-06-13T20:00:00'}, None]),
+    raw_cursor('next', [{'dt': '2031-06-13T20:00:00'}, 2 ** 70]),
+    raw_cursor('sideways', [{'dt': '2031-06-13T20:00:00'}, 42]),
+    raw_cursor('next', 'ab'),
+    'not a cursor',
+    '',
+])
+def test_malformed_cursor_means_first_page(cursor):
+    assert decode_cursor(cursor, SHOW_ORDER) == (None, 'next')
+
+
+def test_string_values_are_checked_per_column():
+    assert decode_cursor(raw_cursor('next', ['CA', 'Oakland', 3]), VENUE_AREA_ORDER) == \
+        (['CA', 'Oakland', 3], 'next')
+    assert decode_cursor(raw_cursor('next', ['CA', 'Oak\x00land', 3]), VENUE_AREA_ORDER) == \
+        (None, 'next')
+    assert decode_cursor(raw_cursor('next', ['CA', 7, 3]), VENUE_AREA_ORDER) == (None, 'next')
+
+
+def test_artist_pages_walk_both_ways(app, listings):
+    venues, artists, shows = listings
+    forward, backward = walk(app, artists_page, lambda artist: artist.id, page_size=3)
+    assert forward == sorted(artists)
+    assert backward == forward
+
+
+def test_show_pages_walk_both_ways(app, listings):
+    forward, backward = walk(app, shows_page, lambda show: (show.start_time, show.id), page_size=4)
+    assert len(forward) == 14
+    assert forward == sorted(forward)
+    assert backward == forward
+
+
+@pytest.mark.parametrize('path, order', [
+    ('/shows', SHOW_ORDER), ('/artists', ARTIST_ORDER), ('/venues', VENUE_AREA_ORDER),
+])
+def test_tampered_cursor_serves_first_page(client, listings, path, order):
+    first = client.get(path).get_data(as_text=True)
+    for values in ([{'dt': 'garbage'}, 'x', 1], ['x'] * len(order), [2 ** 70] * len(order)):
+        response = client.get(path, query_string={'cursor': raw_cursor('next', values)})
+        assert response.status_code == 200
+        assert strip_tokens(response.get_data(as_text=True)) == strip_tokens(first)
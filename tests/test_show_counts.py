@@ -0,0 +1,112 @@
+import csv
+from datetime import datetime, timedelta
+
+import importer
+from conftest import add_show
+from extensions import db
+from models import Venue, Artist, Show, ShowCountState
+from show_counts import rebuild, roll_forward
+
+
+def counts(model, row_id):
+    row = model.query.get(row_id)
+    db.session.refresh(row)
+    return row.upcoming_show_count, row.past_show_count
+
+
+def all_counts():
+    return dict(((model.__name__, row.id), (row.upcoming_show_count, row.past_show_count))
+                for model in (Venue, Artist) for row in model.query.order_by(model.id))
+
+
+def assert_matches_rebuild():
+    # The incrementally maintained counters agree with a full recount
+    # against the same watermark.
+    maintained = all_counts()
+    rebuild(now=ShowCountState.query.get(1).rolled_at)
+    assert all_counts() == maintained
+
+
+def test_counters_follow_show_writes(app, listings):
+    venues, artists, shows = listings
+    with app.app_context():
+        before = counts(Venue, venues[0])
+        show_id = add_show(venues[0], artists[0], days=2)
+        assert counts(Venue, venues[0]) == (before[0] + 1, before[1])
+
+        # Moved into the past and to another venue.
+        show = Show.query.get(show_id)
+        show.start_time = datetime.now() - timedelta(days=2)
+        show.venue_id = venues[1]
+        db.session.commit()
+        assert counts(Venue, venues[0]) == before
+        assert_matches_rebuild()
+
+        Show.query.get(show_id).delete()
+        assert_matches_rebuild()
+
+
+def test_rolled_back_show_leaves_counters(app, listings):
+    venues, artists, shows = listings
+    with app.app_context():
+        before = counts(Artist, artists[0])
+        db.session.add(Show(venue_id=venues[0], artist_id=artists[0],
+                            start_time=datetime.now() + timedelta(days=1)))
+        db.session.flush()
+        db.session.rollback()
+        assert counts(Artist, artists[0]) == before
+
+
+def test_roll_forward_moves_started_shows_to_past(app, listings):
+    venues, artists, shows = listings
+    with app.app_context():
+        before = counts(Venue, venues[2])
+        add_show(venues[2], artists[2], days=1)
+        assert counts(Venue, venues[2]) == (before[0] + 1, before[1])
+
+        moved = roll_forward(now=datetime.now() + timedelta(days=1, hours=1))
+        assert moved >= 1
+        assert counts(Venue, venues[2]) == (before[0], before[1] + 1)
+        assert_matches_rebuild()
+
+
+def write_shows(path, rows):
+    with open(path, 'w', newline='') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(['artist_id', 'venue_id', 'start_time'])
+        writer.writerows(rows)
+
+
+def test_import_applies_counters_per_batch(app, listings, tmp_path, monkeypatch):
+    venues, artists, shows = listings
+    path = str(tmp_path / 'shows.csv')
+    start = datetime.now() + timedelta(days=30)
+    write_shows(path, [(artists[i % 7], venues[i % 7], (start + timedelta(hours=i)).strftime(
+        '%Y-%m-%d %H:%M:%S')) for i in range(10)])
+
+    # The second batch fails to load: the first stays committed, counted
+    # and checkpointed.
+    load_batch, calls = importer.load_batch, []
+
+    def failing(model, rows):
+        calls.append(len(rows))
+        if len(calls) == 2:
+            raise RuntimeError('disk full')
+        load_batch(model, rows)
+
+    monkeypatch.setattr(importer, 'load_batch', failing)
+    result = app.test_cli_runner().invoke(importer.import_command, ['shows', path, '--batch-size', '4'])
+    assert isinstance(result.exception, RuntimeError)
+    with app.app_context():
+        assert Show.query.count() == 14 + 4
+        assert importer.read_checkpoint(path) == 4
+        assert_matches_rebuild()
+
+    monkeypatch.setattr(importer, 'load_batch', load_batch)
+    result = app.test_cli_runner().invoke(importer.import_command, ['shows', path, '--batch-size', '4'])
+    assert result.exception is None, result.output
+    assert 'Resuming after row 4' in result.output
+    with app.app_context():
+        assert Show.query.count() == 14 + 10
+        assert importer.read_checkpoint(path) == 0
+        assert_matches_rebuild()
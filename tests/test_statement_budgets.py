@@ -0,0 +1,81 @@
+import pytest
+
+from cache import response_cache
+from conftest import add_artist, add_show, add_venue
+from models import Venue, Artist
+from queries import StatementBudgetExceeded, statement_budget
+from query_plans import capture_statements
+
+
+def page_statements(client, method, url, data=None):
+    # Every statement the request issued, streamed bodies included, less
+    # session settings and infrastructure work such as index builds.
+    response, statements = capture_statements(client, method, url, data)
+    assert response.status_code == 200, url
+    return [statement for engine, statement, parameters in statements
+            if not statement.startswith('SET ')]
+
+
+def budgeted_routes(venues, artists):
+    return [
+        ('GET', '/venues', None),
+        ('GET', '/artists', None),
+        ('GET', '/shows', None),
+        ('GET', '/venues/{}'.format(venues[0]), None),
+        ('GET', '/artists/{}'.format(artists[0]), None),
+        ('POST', '/venues/search', {'search_term': 'Venue'}),
+        ('POST', '/artists/search', {'search_term': 'Artist'}),
+    ]
+
+
+def api_routes(venues, artists):
+    return [
+        ('GET', '/api/v1/venues', None),
+        ('GET', '/api/v1/artists', None),
+        ('GET', '/api/v1/shows', None),
+        ('GET', '/api/v1/venues/{}'.format(venues[0]), None),
+        ('GET', '/api/v1/artists/{}'.format(artists[0]), None),
+        ('GET', '/api/v1/venues/genres', None),
+        ('GET', '/api/v1/venues/genres/Jazz', None),
+        ('GET', '/api/v1/artists/typeahead?q=Art', None),
+    ]
+
+
+def test_pages_stay_within_their_budget(client, listings):
+    venues, artists, shows = listings
+    for method, url, data in budgeted_routes(venues, artists):
+        # Uncached, then from the cache.
+        assert len(page_statements(client, method, url, data)) <= 2, url
+        assert len(page_statements(client, method, url, data)) <= 2, url
+
+
+def test_statement_counts_do_not_grow_with_rows(app, client, listings):
+    venues, artists, shows = listings
+    routes = budgeted_routes(venues, artists) + api_routes(venues, artists)
+    before = [len(page_statements(client, *route)) for route in routes]
+
+    with app.app_context():
+        for i in range(10):
+            venue_id = add_venue('More Venue {}'.format(i), city='City {}'.format(i))
+            artist_id = add_artist('More Artist {}'.format(i))
+            add_show(venue_id, artist_id, days=i - 5)
+            add_show(venues[0], artist_id, days=i - 5)
+            add_show(venue_id, artists[0], days=i + 1)
+    response_cache.clear()
+
+    after = [len(page_statements(client, *route)) for route in routes]
+    assert dict(zip([url for method, url, data in routes], after)) == \
+        dict(zip([url for method, url, data in routes], before))
+
+
+def test_budget_fails_a_view_that_goes_over(app, client, listings):
+    @app.route('/over-budget')
+    @statement_budget(1)
+    def over_budget():
+        return str((Venue.query.count(), Artist.query.count()))
+
+    with pytest.raises(StatementBudgetExceeded):
+        client.get('/over-budget')
+
+    app.config['ENFORCE_STATEMENT_BUDGETS'] = False
+    assert client.get('/over-budget').status_code == 200
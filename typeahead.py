@@ -0,0 +1,244 @@
+import bisect
+import os
+import threading
+import time
+import unicodedata
+
+from flask import current_app
+from sqlalchemy import event
+
+from extensions import db
+from models import Venue, Artist
+from search import normalize
+
+
+#----------------------------------------------------------------------------#
+# Prefix index.
+#----------------------------------------------------------------------------#
+
+def fold(text):
+    # Lower case, single spaces and no accents, so "cafe" finds "Café".
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return normalize(''.join(char for char in decomposed if not unicodedata.combining(char)))
+
+
+def keys(name):
+    # The whole name, then the name from each later word on: "The Blue
+    # Note" is found by "the b", "blue" and "note".
+    key = fold(name)
+    return key, [key[position + 1:] for position, char in enumerate(key) if char == ' ']
+
+
+def location(city, state):
+    return ', '.join(value for value in (city, state) if value)
+
+
+class PrefixIndex(object):
+    # Two sorted arrays of (key, id) searched with bisect: whole names, which
+    # rank first, and word suffixes, which fill the remaining slots. A
+    # lookup costs a binary search plus `limit` steps, whatever the size.
+    # Every process keeps its own copy.
+
+    def __init__(self, rows=()):
+        self.lock = threading.RLock()
+        self.documents = {}
+        self.names = []
+        self.words = []
+        for doc_id, name, city, state in rows:
+            if name:
+                key, suffixes = keys(name)
+                self.documents[doc_id] = (name, location(city, state))
+                self.names.append((key, doc_id))
+                self.words.extend((suffix, doc_id) for suffix in suffixes)
+        self.names.sort()
+        self.words.sort()
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, doc_id, name, city=None, state=None):
+        with self.lock:
+            self.remove(doc_id)
+            if not name:
+                return
+            key, suffixes = keys(name)
+            self.documents[doc_id] = (name, location(city, state))
+            bisect.insort(self.names, (key, doc_id))
+            for suffix in suffixes:
+                bisect.insort(self.words, (suffix, doc_id))
+
+    def remove(self, doc_id):
+        with self.lock:
+            document = self.documents.pop(doc_id, None)
+            if document is None:
+                return
+            key, suffixes = keys(document[0])
+            self._discard(self.names, (key, doc_id))
+            for suffix in suffixes:
+                self._discard(self.words, (suffix, doc_id))
+
+    @staticmethod
+    def _discard(entries, entry):
+        position = bisect.bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+
+    def lookup(self, prefix, limit):
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+        matches, seen = [], set()
+        with self.lock:
+            for entries in (self.names, self.words):
+                position = bisect.bisect_left(entries, (prefix,))
+                while len(matches) < limit and position < len(entries):
+                    key, doc_id = entries[position]
+                    if not key.startswith(prefix):
+                        break
+                    if doc_id not in seen:
+                        seen.add(doc_id)
+                        matches.append((doc_id,) + self.documents[doc_id])
+                    position += 1
+        return matches
+
+
+#----------------------------------------------------------------------------#
+# Index lifecycle.
+#----------------------------------------------------------------------------#
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+# Changes committed while a model's index is being rebuilt in the
+# background, replayed onto the new index before it replaces the old one.
+_replays = {}
+
+
+def read_generation():
+    path = current_app.config['TYPEAHEAD_GENERATION_PATH']
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def invalidate_indexes():
+    # For writes that bypass the session events (the bulk importer): every
+    # process on the host rebuilds once it sees a new generation file.
+    path = current_app.config['TYPEAHEAD_GENERATION_PATH']
+    if path:
+        temporary = '{}.{}'.format(path, os.getpid())
+        with open(temporary, 'w') as handle:
+            handle.write(repr(time.time()))
+        os.replace(temporary, path)
+
+
+def build_index(model):
+    # Read before the scan, so a bulk load finishing during it triggers
+    # another rebuild.
+    generation = read_generation()
+    # The first lookup may build it inside a request; that scan is not one
+    # of the page's queries.
+    rows = db.session.query(model.id, model.name, model.city, model.state).execution_options(
+        infrastructure=True)
+    index = PrefixIndex(rows.yield_per(current_app.config['API_YIELD_PER']))
+    index.generation = generation
+    return index
+
+
+def load_indexes(app):
+    # Called at startup so the first keystroke does not pay for the build.
+    with app.app_context():
+        for model in (Venue, Artist):
+            get_index(model)
+
+
+def _refresh(app, model):
+    # Other processes' writes are only seen by rebuilding; the old index
+    # keeps answering meanwhile.
+    try:
+        with app.app_context():
+            index = build_index(model)
+            db.session.remove()
+        with _indexes_lock:
+            for doc_id, values in _replays[model]:
+                apply_change(index, doc_id, values)
+            _indexes[model] = index
+    finally:
+        with _indexes_lock:
+            _replays.pop(model, None)
+
+
+def get_index(model):
+    index = _indexes.get(model)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(model)
+            if index is None:
+                index = _indexes[model] = build_index(model)
+    max_age = current_app.config['TYPEAHEAD_MAX_AGE']
+    stale = max_age and time.monotonic() - index.built_at > max_age
+    if (stale or index.generation != read_generation()) and model not in _replays:
+        with _indexes_lock:
+            if model not in _replays:
+                _replays[model] = []
+                threading.Thread(target=_refresh, daemon=True, args=(
+                    current_app._get_current_object(), model)).start()
+    return index
+
+
+def apply_change(index, doc_id, values):
+    if values is None:
+        index.remove(doc_id)
+    else:
+        index.add(doc_id, *values)
+
+
+# Changes are captured at flush time, while the row values are still
+# loaded, and only applied once the transaction commits so a rollback
+# never leaks into suggestions.
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changes(session, flush_context):
+    pending = session.info.setdefault('typeahead_changes', [])
+    for instance in list(session.new) + list(session.dirty):
+        if isinstance(instance, (Venue, Artist)):
+            pending.append((type(instance), instance.id, (
+                instance.name, instance.city, instance.state)))
+    for instance in session.deleted:
+        if isinstance(instance, (Venue, Artist)):
+            pending.append((type(instance), instance.id, None))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_changes(session):
+    changes = session.info.pop('typeahead_changes', [])
+    if not changes:
+        return
+    with _indexes_lock:
+        for model, doc_id, values in changes:
+            if model in _replays:
+                _replays[model].append((doc_id, values))
+            index = _indexes.get(model)
+            if index is not None:
+                apply_change(index, doc_id, values)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('typeahead_changes', None)
+
+
+#----------------------------------------------------------------------------#
+# Lookup.
+#----------------------------------------------------------------------------#
+
+def typeahead(model, prefix, limit=None):
+    if limit is None:
+        limit = current_app.config['TYPEAHEAD_LIMIT']
+    limit = min(limit, current_app.config['TYPEAHEAD_LIMIT'])
+    return [{'id': doc_id, 'name': name, 'location': label}
+            for doc_id, name, label in get_index(model).lookup(prefix, limit)]
@@ -0,0 +1,420 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from flask import Blueprint, render_template, request, flash, redirect, url_for
+from sqlalchemy.exc import SQLAlchemyError
+
+from forms import *
+from models import *
+from queries import *
+import facets
+from cache import response_cache
+from conditional import conditional
+from extensions import db
+from output import stream_page
+from replicas import read_only
+
+pages = Blueprint('pages', __name__)
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+
+@pages.route('/')
+def index():
+    return render_template('pages/home.html')
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@pages.route('/venues')
+@read_only
+@statement_budget(2)
+@conditional(lambda: venue_areas_validator(request.args.get('cursor')))
+@response_cache.cached('venues')
+def venues():
+
+    page = venue_areas(request.args.get('cursor'))
+    response_cache.tag(*['venue:{}'.format(venue.id)
+                         for area in page.items for venue in area['venues']])
+
+    return stream_page('pages/venues.html', areas=page.items, page=page)
+
+
+@pages.route('/venues/search', methods=['GET', 'POST'])
+@read_only
+@statement_budget(2)
+@statement_timeout('SEARCH_STATEMENT_TIMEOUT_MS')
+def search_venues():
+
+    filters = facets.Filters.from_values(request.values)
+    response = facets.search_venues(filters, request.args.get('cursor'))
+
+    return render_template('pages/search_venues.html', results=response, search_term=filters.term, filters=filters)
+
+
+@pages.route('/venues/<int:venue_id>')
+@read_only
+@statement_budget(2)
+@conditional(venue_validator)
+@response_cache.cached('venue:{venue_id}')
+def show_venue(venue_id):
+
+    venue_details = venue_page(venue_id)
+
+    if venue_details:
+        response_cache.tag(*['artist:{}'.format(show['artist_id'])
+                             for show in venue_details['upcoming_shows'] + venue_details['past_shows']])
+        return render_template('pages/show_venue.html', venue=venue_details)
+    return render_template('errors/404.html')
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+
+@pages.route('/venues/create', methods=['GET'])
+def create_venue_form():
+    form = VenueForm()
+    return render_template('forms/new_venue.html', form=form)
+
+
+@pages.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+
+    form = VenueForm(request.form)
+
+    if(form.validate()):
+        try:
+            # Update seeking_talent and description if there in the form
+            seeking_talent = False
+            seeking_description = ""
+            if('seeking_talent' in request.form):
+                seeking_talent = request.form['seeking_talent'] == 'y'
+            if ('seeking_description' in request.form):
+                seeking_description = request.form['seeking_description']
+            new_venue = Venue(
+                name=request.form['name'],
+                genres=request.form.getlist('genres'),
+                address=request.form['address'],
+                city=request.form['city'],
+                state=request.form['state'],
+                phone=request.form['phone'],
+                website_link=request.form['website_link'],
+                facebook_link=request.form['facebook_link'],
+                image_link=request.form['image_link'],
+                seeking_talent=seeking_talent,
+                seeking_description=seeking_description)
+
+            Venue.insert(new_venue)
+            flash('Venue ' + request.form['name'] +
+                  ' was successfully listed!')
+
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(e._message)
+            flash('An error occurred. Venue ' +
+                  request.form['name'] + ' could not be listed.')
+    return render_template('pages/home.html')
+
+
+@pages.route('/venues/<venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+    try:
+        venue = Venue.query.get(venue_id)
+        if venue:
+            Venue.delete(venue)
+    except SQLAlchemyError as e:
+        print(e._message)
+        db.session.rollback()
+    finally:
+        db.session.close()
+    return redirect(url_for("pages.index"))
+
+    # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
+    # clicking that button delete it from the db then redirect the user to the homepage
+
+#  Artists
+#  ----------------------------------------------------------------
+@pages.route('/artists')
+@read_only
+@statement_budget(2)
+@conditional(lambda: artists_validator(request.args.get('cursor')))
+@response_cache.cached('artists')
+def artists():
+
+    page = artists_page(request.args.get('cursor'))
+    response_cache.tag(*['artist:{}'.format(artist.id) for artist in page.items])
+
+    return stream_page('pages/artists.html', artists=page.items, page=page)
+
+
+@pages.route('/artists/search', methods=['GET', 'POST'])
+@read_only
+@statement_budget(2)
+@statement_timeout('SEARCH_STATEMENT_TIMEOUT_MS')
+def search_artists():
+
+    filters = facets.Filters.from_values(request.values)
+    response = facets.search_artists(filters, request.args.get('cursor'))
+
+    return render_template('pages/search_artists.html', results=response, search_term=filters.term, filters=filters)
+
+
+@pages.route('/artists/<int:artist_id>')
+@read_only
+@statement_budget(2)
+@conditional(artist_validator)
+@response_cache.cached('artist:{artist_id}')
+def show_artist(artist_id):
+
+    artist_details = artist_page(artist_id)
+
+    if artist_details:
+        response_cache.tag(*['venue:{}'.format(show['venue_id'])
+                             for show in artist_details['upcoming_shows'] + artist_details['past_shows']])
+        return render_template('pages/show_artist.html', artist=artist_details)
+
+    return render_template('errors/404.html')
+
+#  Update
+#  ----------------------------------------------------------------
+@pages.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+
+    form = ArtistForm()
+
+    query = Artist.query.get(artist_id)
+
+    if(query):
+        artist_details = Artist.details(query)
+
+        form.name.data = artist_details["name"]
+        form.genres.data = artist_details["genres"]
+        form.city.data = artist_details["city"]
+        form.state.data = artist_details["state"]
+        form.phone.data = artist_details["phone"]
+        form.website_link.data = artist_details["website_link"]
+        form.facebook_link.data = artist_details["facebook_link"]
+        form.image_link.data = artist_details["image_link"]
+
+        return render_template('forms/edit_artist.html', form=form, artist=artist_details)
+
+    return render_template('errors/404.html')
+
+
+@pages.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+
+    form = ArtistForm(request.form)
+    artist_data = Artist.query.get(artist_id)
+
+    if(artist_data and form.validate()):
+        try:
+            # Update seeking_talent and description if there in the form
+            seeking_talent = False
+            seeking_description = ""
+            if('seeking_talent' in request.form):
+                seeking_talent = request.form['seeking_talent'] == 'y'
+            if ('seeking_description' in request.form):
+                seeking_description = request.form['seeking_description']
+            setattr(artist_data, 'name', request.form['name'])
+            setattr(artist_data, 'genres', request.form.getlist('genres'))
+            setattr(artist_data, 'city', request.form['city'])
+            setattr(artist_data, 'state', request.form['state'])
+            setattr(artist_data, 'phone', request.form['phone'])
+            setattr(artist_data, 'website_link', request.form['website_link'])
+            setattr(artist_data, 'facebook_link', request.form['facebook_link'])
+            setattr(artist_data, 'image_link', request.form['image_link'])
+            Artist.update(artist_data)
+
+            return redirect(url_for('pages.show_artist', artist_id=artist_id))
+
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(e._message)
+            flash('An error occurred. Artist ' +
+                  request.form['name'] + ' could not be updated.')
+
+    return render_template('errors/404.html'), 40
+
+
+
+@pages.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+    form = VenueForm()
+
+    query = Venue.query.get(venue_id)
+
+    if(query):
+
+        venue_details = Venue.details(query)
+        form.name.data = venue_details["name"]
+        form.genres.data = venue_details["genres"]
+        form.city.data = venue_details["city"]
+        form.address.data = venue_details["address"]
+        form.state.data = venue_details["state"]
+        form.phone.data = venue_details["phone"]
+        form.website_link.data = venue_details["website_link"]
+        form.facebook_link.data = venue_details["facebook_link"]
+        form.image_link.data = venue_details["image_link"]
+
+        return render_template('forms/edit_venue.html', form=form, venue=venue_details)
+
+    return render_template('errors/404.html')
+
+
+@pages.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+
+    form = VenueForm(request.form)
+    venue_data = Venue.query.get(venue_id)
+
+    if(venue_data and form.validate()):
+        try:
+            # Update seeking_talent and description if there in the form
+            seeking_talent = False
+            seeking_description = ""
+            if('seeking_talent' in request.form):
+                seeking_talent = request.form['seeking_talent'] == 'y'
+            if ('seeking_description' in request.form):
+                seeking_description = request.form['seeking_description']
+            setattr(venue_data, 'name', request.form['name'])
+            setattr(venue_data, 'genres', request.form.getlist('genres'))
+            setattr(venue_data, 'address', request.form['address'])
+            setattr(venue_data, 'city', request.form['city'])
+            setattr(venue_data, 'state', request.form['state'])
+            setattr(venue_data, 'phone', request.form['phone'])
+            setattr(venue_data, 'website_link', request.form['website_link'])
+            setattr(venue_data, 'facebook_link', request.form['facebook_link'])
+            setattr(venue_data, 'image_link', request.form['image_link'])
+            setattr(venue_data, 'seeking_description', seeking_description)
+            setattr(venue_data, 'seeking_talent', seeking_talent)
+            Venue.update(venue_data)
+
+            return redirect(url_for('pages.show_venue', venue_id=venue_id))
+
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(e._message)
+            flash('An error occurred. Venue ' +
+                  request.form['name'] + ' could not be updated.')
+
+    return render_template('errors/404.html'), 40
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+
+@pages.route('/artists/create', methods=['GET'])
+def create_artist_form():
+    form = ArtistForm()
+    return render_template('forms/new_artist.html', form=form)
+
+
+@pages.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+
+    form = ArtistForm(request.form)
+
+    if(form.validate()):
+        try:
+            seeking_venue = False
+            seeking_description = ""
+            if('seeking_venue' in request.form):
+                seeking_venue = request.form['seeking_venue'] == 'y'
+            if ('seeking_description' in request.form):
+                seeking_description = request.form['seeking_description']
+            new_artist = Artist(
+                name=request.form['name'],
+                genres=request.form.getlist('genres'),
+                city=request.form['city'],
+                state=request.form['state'],
+                phone=request.form['phone'],
+                website_link=request.form['website_link'],
+                facebook_link=request.form['facebook_link'],
+                image_link=request.form['image_link'],
+                seeking_venue=seeking_venue,
+                seeking_description=seeking_description)
+
+            Artist.insert(new_artist)
+            flash('Artist ' + request.form['name'] +
+                  ' was successfully listed!')
+
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(e._message)
+            flash('An error occurred. Artist ' +
+
+                  request.form['name'] + ' could not be listed.')
+    return render_template('pages/home.html')
+
+
+@pages.route('/artist/<artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+    try:
+        artist = Artist.query.get(artist_id)
+        if artist:
+            Artist.delete(artist)
+    except SQLAlchemyError as e:
+        print(e._message)
+        db.session.rollback()
+    finally:
+        db.session.close()
+    return redirect(url_for("pages.index"))
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@pages.route('/shows')
+@read_only
+@statement_budget(2)
+@conditional(lambda: shows_validator(request.args.get('cursor')))
+@response_cache.cached('shows')
+def shows():
+
+    page = shows_page(request.args.get('cursor'))
+    response_cache.tag(*['venue:{}'.format(show.venue_id) for show in page.items])
+    response_cache.tag(*['artist:{}'.format(show.artist_id) for show in page.items])
+
+    return stream_page('pages/shows.html', shows=page.items, page=page)
+
+
+@pages.route('/shows/create')
+def create_shows():
+
+    form = ShowForm()
+    return render_template('forms/new_show.html', form=form)
+
+
+@pages.route('/shows/create', methods=['POST'])
+def create_show_submission():
+
+    form = ShowForm(request.form)
+
+    if(form.validate()):
+        try:
+            new_show = Show(
+                venue_id=request.form['venue_id'],
+                artist_id=request.form['artist_id'],
+                start_time=form.start_time.data)
+            Show.insert(new_show)
+            flash('Show was successfully listed!')
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            flash('An error occurred. Show could not be listed.')
+
+    return render_template('pages/home.html')
+
+
+@pages.app_errorhandler(404)
+def not_found_error(error):
+    return render_template('errors/404.html'), 404
+
+
+@pages.app_errorhandler(500)
+def server_error(error):
+    return render_template('errors/500.html'), 500